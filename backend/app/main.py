@@ -1,21 +1,50 @@
+import asyncio
 import os
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from app.routes import upload, docs, chat, health
-import logging
 
-# Load environment variables
+# Load environment variables before the app modules below read their configuration
 load_dotenv()
 
+from app.routes import upload, docs, chat, graph, health  # noqa: E402
+from app.services.ai_service import ai_service, embedding_service  # noqa: E402
+from app.services.cleanup import run_periodic_cleanup  # noqa: E402
+from app.services.metrics import HTTP_REQUEST_DURATION, SERVER_TIMING_ENABLED, server_timing_header, start_request_spans  # noqa: E402
+from app.services.repository_store import repository_store  # noqa: E402
+from app.services.warmup import warm_up  # noqa: E402
+from app.services.worker_pool import shutdown_pool  # noqa: E402
+import logging  # noqa: E402
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Evict expired repositories and stale uploads in the background
+    cleanup_task = asyncio.create_task(run_periodic_cleanup(repository_store))
+    # Create clients and load recent repositories without holding up startup, so health
+    # checks pass as soon as the server is listening
+    warm_up_task = asyncio.create_task(warm_up(repository_store, ai_service, embedding_service))
+    yield
+    for task in (warm_up_task, cleanup_task):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Close pooled upstream connections on shutdown
+    await ai_service.aclose()
+    await embedding_service.aclose()
+    repository_store.close()
+    shutdown_pool()
+
 app = FastAPI(
     title="CodeMind Lite API",
     description="AI-powered repository analysis and chat using Gemini via OpenRouter",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for local development
@@ -29,11 +58,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time each request by route, adding a Server-Timing header when SERVER_TIMING is enabled"""
+    spans = start_request_spans()
+    start = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - start
+
+    # Label by route template (/jobs/{job_id}), not the raw path, to keep the label set small
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.observe(
+        duration,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    )
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing_header(spans, duration)
+    return response
+
 # Include routers
 app.include_router(health.router, tags=["Health"])
 app.include_router(upload.router, tags=["Upload"])
 app.include_router(docs.router, tags=["Documentation"])
 app.include_router(chat.router, tags=["Chat"])
+app.include_router(graph.router, tags=["Graph"])
 
 @app.get("/")
 async def root():
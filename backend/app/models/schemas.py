@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 class ChatRequest(BaseModel):
     repo_id: str
@@ -8,6 +8,8 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     message: str
     relevant_files: List[str] = []
+    prompt_tokens: Optional[int] = None  # estimated size of the repository context sent
+    dropped_files: int = 0  # files left out to fit the context budget
 
 class Repository(BaseModel):
     id: str
@@ -15,13 +17,32 @@ class Repository(BaseModel):
     uploaded_at: str
     file_count: int
 
+class UploadJob(BaseModel):
+    job_id: str
+    repo_id: str
+    name: str
+    status: str  # pending, extracting, indexing, completed or failed
+    files_scanned: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    error: Optional[str] = None
+    repository: Optional[Repository] = None
+
 class DocumentationRequest(BaseModel):
     repo_id: str
+    # "single" prompt, map-reduce "pipeline", or "auto" to pick the pipeline for large repositories
+    mode: Literal["auto", "single", "pipeline"] = "auto"
 
 class DocumentationResponse(BaseModel):
     documentation: str
+    prompt_tokens: Optional[int] = None
+    dropped_files: int = 0
 
 class HealthResponse(BaseModel):
     status: str
     message: str
-    ai_provider: str = "Gemini via OpenRouter"
\ No newline at end of file
+    ai_provider: str = "Gemini via OpenRouter"
+    embedding_cache: Optional[Dict[str, Any]] = None
+    storage: Optional[Dict[str, Any]] = None
+    response_cache: Optional[Dict[str, Any]] = None
+    upstream: Optional[Dict[str, Any]] = None
\ No newline at end of file
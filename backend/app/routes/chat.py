@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.schemas import ChatRequest, ChatResponse
-from app.routes.upload import repositories
-from app.services.ai_service import generate_ai_response
+from app.routes.upload import get_repository
+from app.services.ai_service import generate_ai_response, stream_ai_response
+from app.services.utils import SSE_HEADERS, format_sse
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,10 +13,7 @@ router = APIRouter()
 async def chat_with_repository(request: ChatRequest):
     """Chat with the uploaded repository using AI"""
     
-    if request.repo_id not in repositories:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    
-    repo = repositories[request.repo_id]
+    repo = await get_repository(request.repo_id)
 
     try:
         # The AI service will now determine the best context (embeddings or all files) for any question.
@@ -22,9 +21,41 @@ async def chat_with_repository(request: ChatRequest):
 
         return ChatResponse(
             message=response_data["message"],
-            relevant_files=response_data["relevant_files"]
+            relevant_files=response_data["relevant_files"],
+            prompt_tokens=response_data["prompt_tokens"],
+            dropped_files=response_data["dropped_files"]
         )
         
     except Exception as e:
         logger.error(f"Chat request failed: {e}")
         raise HTTPException(status_code=500, detail=f"Chat request failed: {str(e)}")
+
+@router.post("/chat/stream")
+async def chat_with_repository_stream(request: ChatRequest):
+    """Chat with the uploaded repository, streaming the answer as server-sent events.
+
+    Emits a "token" data event per chunk of text, then a "done" event with the relevant files.
+    """
+    
+    repo = await get_repository(request.repo_id)
+
+    try:
+        prompt, tokens = await stream_ai_response(repo, request.message)
+    except Exception as e:
+        logger.error(f"Chat request failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Chat request failed: {str(e)}")
+
+    async def events():
+        try:
+            async for token in tokens:
+                yield format_sse({"token": token})
+            yield format_sse({
+                "relevant_files": prompt["relevant_files"],
+                "prompt_tokens": prompt["prompt_tokens"],
+                "dropped_files": prompt["dropped_files"]
+            }, event="done")
+        except Exception as e:
+            logger.error(f"Chat stream failed: {e}")
+            yield format_sse({"detail": f"Chat request failed: {str(e)}"}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
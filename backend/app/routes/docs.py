@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.schemas import DocumentationRequest, DocumentationResponse
-from app.routes.upload import repositories
-from app.services.ai_service import generate_documentation
+from app.routes.upload import get_repository
+from app.services.ai_service import generate_documentation, stream_documentation
+from app.services.utils import SSE_HEADERS, format_sse
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,17 +13,44 @@ router = APIRouter()
 async def generate_documentation_endpoint(request: DocumentationRequest):
     """Generate documentation for uploaded repository"""
     
-    if request.repo_id not in repositories:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    
-    repo = repositories[request.repo_id]
+    repo = await get_repository(request.repo_id)
     
     try:
         # Generate AI documentation
-        documentation = await generate_documentation(repo)
+        result = await generate_documentation(repo, request.mode)
         
-        return DocumentationResponse(documentation=documentation)
+        return DocumentationResponse(
+            documentation=result["documentation"],
+            prompt_tokens=result["prompt_tokens"],
+            dropped_files=result["dropped_files"]
+        )
         
     except Exception as e:
         logger.error(f"Documentation generation failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Documentation generation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Documentation generation failed: {str(e)}")
+
+@router.post("/generate_docs/stream")
+async def generate_documentation_stream(request: DocumentationRequest):
+    """Generate documentation, streaming it as server-sent events as the model writes it"""
+    
+    repo = await get_repository(request.repo_id)
+
+    try:
+        prompt, tokens = await stream_documentation(repo, request.mode)
+    except Exception as e:
+        logger.error(f"Documentation generation failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Documentation generation failed: {str(e)}")
+
+    async def events():
+        try:
+            async for token in tokens:
+                yield format_sse({"token": token})
+            yield format_sse({
+                "prompt_tokens": prompt["prompt_tokens"],
+                "dropped_files": prompt["dropped_files"]
+            }, event="done")
+        except Exception as e:
+            logger.error(f"Documentation generation failed: {e}")
+            yield format_sse({"detail": f"Documentation generation failed: {str(e)}"}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,93 @@
+import asyncio
+from collections import defaultdict
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.routes.upload import get_repository
+from app.services.ai_service import load_code_graph
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# Files per page when the graph is listed without a symbol or file
+MAX_GRAPH_PAGE = 500
+
+@router.get("/repositories/{repo_id}/graph")
+async def get_repository_graph(
+    repo_id: str,
+    symbol: Optional[str] = None,
+    file: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_GRAPH_PAGE)
+):
+    """Query the repository's code graph.
+
+    With symbol (a name, Class.method or module.name), returns the matching definitions with
+    their callers and callees. With file (a path, path suffix or module name), returns the
+    matching files with what they import and what imports them. Without either, returns
+    summary counts and one page of files (offset, limit) with their counts; query a file
+    or symbol for the full detail.
+    """
+    repo = await get_repository(repo_id)
+    graph = await load_code_graph(repo)
+
+    if symbol is not None:
+        matches = graph.find_definitions(symbol)
+        if not matches:
+            raise HTTPException(status_code=404, detail=f"No definition named {symbol}")
+        return {
+            "symbol": symbol,
+            "definitions": [
+                {
+                    **graph.definition(index),
+                    "callers": [graph.definition(i) for i in graph.callers[index]],
+                    "callees": [graph.definition(i) for i in graph.callees[index]]
+                }
+                for index in matches
+            ]
+        }
+
+    if file is not None:
+        matches = graph.find_files(file)
+        if not matches:
+            raise HTTPException(status_code=404, detail=f"No file matching {file}")
+        return {
+            "file": file,
+            "files": [
+                {
+                    "path": graph.files[index],
+                    "imports": [graph.files[i] for i in graph.imports[index]],
+                    "imported_by": [graph.files[i] for i in graph.importers[index]],
+                    "external_imports": graph.external_imports[index],
+                    "definitions": [
+                        graph.definition(i) for i, row in enumerate(graph.definitions)
+                        if row[0] == index and row[2] != 'module'
+                    ]
+                }
+                for index in matches
+            ]
+        }
+
+    def overview():
+        page = range(offset, min(offset + limit, len(graph.files)))
+        definitions = defaultdict(int)
+        for row in graph.definitions:
+            if row[0] in page and row[2] != 'module':
+                definitions[row[0]] += 1
+        return {
+            "repo_id": repo_id,
+            "stats": graph.stats(),
+            "offset": offset,
+            "limit": limit,
+            "files": [
+                {
+                    "path": graph.files[index],
+                    "definitions": definitions[index],
+                    "imports": len(graph.imports.get(index, ())),
+                    "imported_by": len(graph.importers.get(index, ()))
+                }
+                for index in page
+            ]
+        }
+
+    return await asyncio.to_thread(overview)
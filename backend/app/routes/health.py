@@ -1,5 +1,13 @@
+import asyncio
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 from app.models.schemas import HealthResponse
+from app.services.ai_service import embedding_service
+from app.services.cleanup import temp_usage
+from app.services.metrics import REGISTRY
+from app.services.repository_store import repository_store
+from app.services.response_cache import response_cache
+from app.services.scheduler import upstream_scheduler
 import os
 
 router = APIRouter()
@@ -10,13 +18,27 @@ async def health_check():
     
     # Check if OpenRouter API key is configured
     api_key_configured = bool(os.getenv("OPENROUTER_API_KEY"))
+
+    storage = await asyncio.to_thread(repository_store.usage)
+    storage.update(await asyncio.to_thread(temp_usage))
+    # Counting cache entries waits on the lock that embedding workers write under
+    embedding_cache = await asyncio.to_thread(embedding_service.cache.stats) if embedding_service.cache else None
     
     return HealthResponse(
         status="healthy",
         message=f"CodeMind Lite API is running. AI features: {'enabled' if api_key_configured else 'fallback mode'}",
-        ai_provider="Gemini via OpenRouter"
+        ai_provider="Gemini via OpenRouter",
+        embedding_cache=embedding_cache,
+        storage=storage,
+        response_cache=response_cache.stats(),
+        upstream=upstream_scheduler.stats()
     )
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latencies and token/byte counters in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @router.get("/")
 async def simple_health():
     """Simple health check that returns 'ok' for basic monitoring"""
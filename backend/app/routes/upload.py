@@ -1,90 +1,242 @@
+import asyncio
 import os
 import tempfile
+import time
+import uuid
 import zipfile
 from datetime import datetime
-from pathlib import Path
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.models.schemas import Repository
-from app.services.utils import extract_python_files
+from typing import List, Dict, Any, Optional
+import aiofiles
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Form, HTTPException
+from app.models.schemas import Repository, UploadJob
+from app.services.extractors import extract_source_files
+from app.services.utils import UPLOAD_TEMP_DIR, remove_file
+from app.services.ai_service import embedding_service
+from app.services.code_graph import CodeGraph, build_code_graph
+from app.services.metrics import UPLOAD_BYTES, stage_timer
+from app.services.repository_store import repository_store, new_repository_id
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# In-memory storage for development (use database in production)
-repositories = {}
+# Upload limits
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
+READ_CHUNK_SIZE = 1024 * 1024
 
-@router.post("/upload", response_model=Repository)
-async def upload_repository(file: UploadFile = File(...)):
-    """Upload and process a Python repository ZIP file"""
-    
-    # Validate file type
-    if not file.filename or not file.filename.endswith('.zip'):
-        raise HTTPException(status_code=400, detail="Only ZIP files are allowed")
-    
-    # Check file size (50MB limit)
-    max_size = 50 * 1024 * 1024  # 50MB
-    file_content = await file.read()
-    if len(file_content) > max_size:
-        raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
-    
-    # Reset file pointer
-    await file.seek(0)
-    
-    # Create temporary directory
-    temp_dir = tempfile.mkdtemp()
-    repo_id = f"repo_{len(repositories) + 1}"
-    
+# Minimum seconds between saving job progress to the store
+PROGRESS_SAVE_INTERVAL = 0.5
+
+async def save_upload(file: UploadFile, max_size: int) -> str:
+    """Stream the upload to a temp file, stopping as soon as the size limit is exceeded.
+
+    The background job needs its own copy because the request's upload is closed
+    once the response is sent.
+    """
+    os.makedirs(UPLOAD_TEMP_DIR, exist_ok=True)
+    fd, zip_path = tempfile.mkstemp(suffix=".zip", dir=UPLOAD_TEMP_DIR)
+    os.close(fd)
+
+    total = 0
     try:
-        # Save uploaded file
-        zip_path = os.path.join(temp_dir, file.filename)
-        with open(zip_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Extract and process Python files
-        python_files = await extract_python_files(zip_path, temp_dir)
-        
-        if not python_files:
-            raise HTTPException(status_code=400, detail="No Python files found in the uploaded ZIP")
-        
+        with stage_timer("upload_save"):
+            async with aiofiles.open(zip_path, "wb") as buffer:
+                while chunk := await file.read(READ_CHUNK_SIZE):
+                    total += len(chunk)
+                    if total > max_size:
+                        raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
+                    await buffer.write(chunk)
+    except BaseException:
+        os.remove(zip_path)
+        raise
+    UPLOAD_BYTES.inc(total)
+
+    return zip_path
+
+async def get_repository(repo_id: str) -> Dict[str, Any]:
+    """Load a processed repository, raising 409 while its first upload job is still running.
+
+    While a re-upload is processed the previous version keeps being served.
+    """
+    repo = await asyncio.to_thread(repository_store.get, repo_id)
+    if repo is not None:
+        return repo
+
+    if await asyncio.to_thread(repository_store.is_processing, repo_id):
+        raise HTTPException(status_code=409, detail="Repository is still being processed")
+
+    raise HTTPException(status_code=404, detail="Repository not found")
+
+def reuse_unchanged_files(source_files: List[Dict[str, Any]], previous: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Keep the stored records of files whose content is unchanged, with their cached outlines"""
+    old_files = {f['path']: f for f in previous['files']}
+    return [
+        old_files[f['path']] if f['path'] in old_files and old_files[f['path']].get('sha256') == f['sha256'] else f
+        for f in source_files
+    ]
+
+def job_response(job: Dict[str, Any]) -> UploadJob:
+    repository = None
+    if job['status'] == 'completed':
+        metadata = repository_store.metadata(job['repo_id'])
+        if metadata is not None:
+            repository = Repository(**metadata)
+
+    return UploadJob(
+        job_id=job['id'],
+        repo_id=job['repo_id'],
+        name=job['name'],
+        status=job['status'],
+        files_scanned=job['files_scanned'],
+        chunks_total=job['chunks_total'],
+        chunks_embedded=job['chunks_embedded'],
+        error=job['error'],
+        repository=repository
+    )
+
+async def process_upload(job: Dict[str, Any], zip_path: str):
+    """Background job: read the source files and build the embedding index for an upload.
+
+    For a re-upload of an existing repository only new and changed files are indexed.
+    Progress is saved to the repository store so any worker can report it.
+    """
+    repo_id = job['repo_id']
+    last_saved = 0.0
+
+    def save_progress(status: Optional[str] = None):
+        nonlocal last_saved
+        if status is not None:
+            job['status'] = status
+        elif time.monotonic() - last_saved < PROGRESS_SAVE_INTERVAL:
+            return
+        last_saved = time.monotonic()
+        repository_store.save_job(job)
+
+    def on_file():
+        job['files_scanned'] += 1
+        save_progress()
+
+    # Embedding progress is reported on the event loop, so it is saved from a worker thread,
+    # with at most one save pending; the status saves wait for it so they are written last
+    pending_save: Optional[asyncio.Future] = None
+
+    def on_embedded(embedded: int, total: int):
+        nonlocal pending_save
+        job['chunks_embedded'] = embedded
+        job['chunks_total'] = total
+        if pending_save is None or pending_save.done():
+            pending_save = asyncio.ensure_future(asyncio.to_thread(save_progress))
+
+    async def set_status(status: str):
+        if pending_save is not None:
+            await asyncio.gather(pending_save, return_exceptions=True)
+        await asyncio.to_thread(save_progress, status)
+
+    try:
+        previous = await asyncio.to_thread(repository_store.get, repo_id)
+
+        # Unzipping and decoding is blocking work, keep it off the event loop
+        await set_status('extracting')
+        source_files = await asyncio.to_thread(extract_source_files, zip_path, on_file)
+        # The archive isn't needed once its files are read, free the disk space before indexing
+        remove_file(zip_path)
+
+        if not source_files:
+            raise ValueError("No supported source files found in the uploaded ZIP")
+        if previous is not None:
+            source_files = reuse_unchanged_files(source_files, previous)
+
+        # Build the embedding index once so chat requests only embed the query
+        await set_status('indexing')
+        # (without vectors if embeddings are unavailable, they are then built on first chat)
+        with stage_timer("index"):
+            index = await embedding_service.build_index(source_files, on_embedded, previous, key=repo_id)
+        # Imports, definitions and calls, for structural questions and related context
+        with stage_timer("code_graph"):
+            code_graph = await asyncio.to_thread(
+                lambda: CodeGraph(build_code_graph(source_files, index['symbols'], previous and previous.get('code_graph')))
+            )
+
         # Store repository data
-        repositories[repo_id] = {
+        repo = {
             'id': repo_id,
-            'name': file.filename.replace('.zip', ''),
-            'files': python_files,
-            'temp_dir': temp_dir,
+            'name': job['name'],
+            'files': source_files,
             'uploaded_at': datetime.now().isoformat(),
-            'file_count': len(python_files)
+            'file_count': len(source_files),
+            'chunks': index['chunks'],
+            'symbols': index['symbols'],
+            'code_graph': code_graph,
+            'lexical_index': index['lexical_index'],
+            'vector_index': index['vector_index']
         }
-        
-        logger.info(f"Successfully uploaded repository {repo_id} with {len(python_files)} Python files")
-        
-        return Repository(
-            id=repo_id,
-            name=repositories[repo_id]['name'],
-            uploaded_at=repositories[repo_id]['uploaded_at'],
-            file_count=repositories[repo_id]['file_count']
-        )
-        
-    except HTTPException:
-        # Re-raise HTTP exceptions
-        raise
+        with stage_timer("store"):
+            await asyncio.to_thread(repository_store.put, repo)
+        await set_status('completed')
+
+        logger.info(f"Successfully uploaded repository {repo_id} with {len(source_files)} source files")
+
     except Exception as e:
-        logger.error(f"Upload failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+        logger.error(f"Upload job {job['id']} failed: {e}")
+        job['error'] = str(e)
+        await set_status('failed')
+    finally:
+        remove_file(zip_path)
+
+@router.post("/upload", response_model=UploadJob, status_code=202)
+async def upload_repository(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    repo_id: Optional[str] = Form(None)
+):
+    """Upload a repository ZIP file and start processing it in the background.
+
+    Pass the repo_id of an uploaded repository to replace it with a new version; files
+    that are unchanged since the last upload are not re-indexed.
+    """
+
+    # Validate file type
+    if not file.filename or not file.filename.endswith('.zip'):
+        raise HTTPException(status_code=400, detail="Only ZIP files are allowed")
+
+    # Check file size (50MB limit) while saving, without holding the upload in memory
+    zip_path = await save_upload(file, MAX_UPLOAD_SIZE)
+
+    if not await asyncio.to_thread(zipfile.is_zipfile, zip_path):
+        os.remove(zip_path)
+        raise HTTPException(status_code=400, detail="Invalid ZIP file")
+
+    if repo_id is not None and not await asyncio.to_thread(repository_store.exists, repo_id):
+        os.remove(zip_path)
+        raise HTTPException(status_code=404, detail="Repository not found")
+
+    job = {
+        'id': uuid.uuid4().hex,
+        'repo_id': repo_id or new_repository_id(),
+        'name': file.filename.replace('.zip', ''),
+        'status': 'pending',
+        'files_scanned': 0,
+        'chunks_total': 0,
+        'chunks_embedded': 0,
+        'error': None
+    }
+    # Registered atomically, so two re-uploads of the same repository can't both start
+    if not await asyncio.to_thread(repository_store.create_job, job):
+        os.remove(zip_path)
+        raise HTTPException(status_code=409, detail="Repository is still being processed")
+    background_tasks.add_task(process_upload, job, zip_path)
+
+    return job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=UploadJob)
+async def get_upload_job(job_id: str):
+    """Report the progress of an upload processing job"""
+    job = await asyncio.to_thread(repository_store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await asyncio.to_thread(job_response, job)
 
 @router.get("/repositories")
 async def list_repositories():
     """List all uploaded repositories (for debugging)"""
-    return {
-        "repositories": [
-            {
-                "id": repo_id,
-                "name": repo_data["name"],
-                "file_count": repo_data["file_count"],
-                "uploaded_at": repo_data["uploaded_at"]
-            }
-            for repo_id, repo_data in repositories.items()
-        ]
-    }
\ No newline at end of file
+    return {"repositories": await asyncio.to_thread(repository_store.list_repositories)}
\ No newline at end of file
@@ -1,9 +1,26 @@
+import asyncio
+import json
 import os
-import requests
-from typing import Dict, Any, List
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Any, AsyncIterator, List, Optional, Tuple
 import logging
 
+from app.services.chunker import lookup_symbols
+from app.services.code_graph import CodeGraph, answer_structural_question, get_code_graph
+from app.services.context_builder import CONTEXT_TOKEN_BUDGET, ContextBuilder, rank_files_by_query
+from app.services.documentation import DocumentationPipeline
 from app.services.embeddings import EmbeddingService
+from app.services.metrics import COMPLETION_FIRST_TOKEN, COMPLETION_TOKENS, CONTEXT_TOKENS, stage_timer
+from app.services.repository_store import repository_store
+from app.services.response_cache import StreamedResponse, normalize_question, repository_hash, response_cache
+from app.services.retrieval import search_chunks
+from app.services.scheduler import BACKGROUND, INTERACTIVE, upstream_scheduler
+from app.services.utils import estimate_tokens
+
+if TYPE_CHECKING:
+    import httpx
+
 logger = logging.getLogger(__name__)
 
 class AIService:
@@ -11,26 +28,55 @@ class AIService:
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
         self.model = "x-ai/grok-4-fast:free"
+
+        # One pooled keep-alive client is shared by every request; the upstream scheduler caps
+        # in-flight requests and paces them to the rate limit
+        self.timeout = float(os.getenv("OPENROUTER_TIMEOUT", 60))  # give more time for large repos
+        self.max_concurrency = upstream_scheduler.max_concurrency
+        # Retries of a completion rejected with 429, each after the pause the upstream asked for
+        self.max_retries = int(os.getenv("OPENROUTER_MAX_RETRIES", 2))
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._client_lock = threading.Lock()
         
         if not self.api_key:
             logger.warning("OPENROUTER_API_KEY not found. AI features will use fallback responses.")
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """Shared async HTTP client for OpenRouter, created on first use"""
+        if self._client is not None:
+            return self._client
+        # Locked, as warm-up and a first request may both get here
+        with self._client_lock:
+            if self._client is not None:
+                return self._client
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                    "HTTP-Referer": "http://localhost:10000",
+                    "X-Title": "CodeMind Lite"
+                },
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
-    async def generate_response(self, context: str, question: str) -> str:
-        """Generate AI response using OpenRouter Grok-4"""
-        
-        if not self.api_key:
-            return self._fallback_response(context, question)
-        
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "http://localhost:10000",
-                "X-Title": "CodeMind Lite"
-            }
-            
-            # Pass the full context now
-            prompt = f"""You are an AI assistant helping users understand their Python code repository.
+    def _build_payload(self, context: str, question: str, stream: bool = False) -> Dict[str, Any]:
+        # Pass the full context now
+        prompt = f"""You are an AI assistant helping users understand their code repository.
 
 Repository Context:
 {context}
@@ -38,119 +84,556 @@ Repository Context:
 User Question: {question}
 
 Please provide a helpful, accurate response about the code. If you can't find specific information in the context, say so clearly. Keep responses concise but informative."""
+        
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 1000,  # Increase if needed
+            "temperature": 0.7
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def generate_response(self, context: str, question: str, graph: Optional[CodeGraph] = None) -> str:
+        """Generate AI response using OpenRouter Grok-4"""
+        response = await self.complete(context, question)
+        if response is None:
+            return self._fallback_response(context, question, graph)
+        return response
+
+    async def complete(self, context: str, question: str, priority: str = INTERACTIVE, key: str = "") -> Optional[str]:
+        """Call the completion API, returning None when it is unavailable or fails.
+
+        The request goes through the upstream scheduler in the priority lane, queued
+        with other requests for the same key (a repository id).
+        """
+        
+        if not self.api_key:
+            return None
+        
+        try:
+            payload = self._build_payload(context, question)
             
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 1000,  # Increase if needed
-                "temperature": 0.7
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60  # give more time for large repos
-            )
+            for attempt in range(self.max_retries + 1):
+                async with upstream_scheduler.slot(priority, key):
+                    with stage_timer("completion"):
+                        response = await self.client.post("/chat/completions", json=payload)
+                retry = upstream_scheduler.observe(response.status_code, response.headers)
+                if not retry or attempt == self.max_retries:
+                    break
             
             if response.status_code == 200:
                 result = response.json()
+                _count_usage(result.get("usage"))
                 return result["choices"][0]["message"]["content"]
             else:
                 logger.error(f"OpenRouter API error: {response.status_code} - {response.text}")
-                return self._fallback_response(context, question)
+                return None
                 
         except Exception as e:
             logger.error(f"Error calling AI API: {e}")
-            return self._fallback_response(context, question)
+            return None
+
+    async def stream_response(
+        self,
+        context: str,
+        question: str,
+        graph: Optional[CodeGraph] = None,
+        priority: str = INTERACTIVE,
+        key: str = "",
+        fallback: bool = True
+    ) -> AsyncIterator[str]:
+        """Stream the AI response token by token as OpenRouter generates it.
+
+        The scheduler slot is held until the stream ends. Failures before the first token
+        give the fallback response, or raise with fallback=False so the caller can tell;
+        a malformed event or a stream cut short after that raises, since the text sent so
+        far is incomplete.
+        """
+        
+        if not self.api_key:
+            if not fallback:
+                raise ValueError("AI service is not configured. OPENROUTER_API_KEY is missing.")
+            yield self._fallback_response(context, question, graph)
+            return
+        
+        streamed_any = False
+        try:
+            payload = self._build_payload(context, question, stream=True)
+            
+            for attempt in range(self.max_retries + 1):
+                async with upstream_scheduler.slot(priority, key):
+                    start = time.perf_counter()
+                    async with self.client.stream("POST", "/chat/completions", json=payload) as response:
+                        retry = upstream_scheduler.observe(response.status_code, response.headers)
+                        if response.status_code != 200:
+                            body = await response.aread()
+                            if retry and attempt < self.max_retries:
+                                continue
+                            raise ValueError(f"OpenRouter API error: {response.status_code} - {body.decode(errors='replace')}")
+                        
+                        # Server-sent events: "data: {json}" lines, ": comment" keep-alives, "data: [DONE]" at the end
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            
+                            try:
+                                event = json.loads(data)
+                            except ValueError:
+                                raise ValueError(f"Malformed event in the completion stream: {data[:200]}")
+                            # The final chunk carries the token usage of the whole response
+                            _count_usage(event.get("usage"))
+                            choices = event.get("choices") or []
+                            token = choices[0].get("delta", {}).get("content") if choices else None
+                            if token:
+                                if not streamed_any:
+                                    COMPLETION_FIRST_TOKEN.observe(time.perf_counter() - start)
+                                streamed_any = True
+                                yield token
+                        raise ValueError("Completion stream ended before the response was complete")
+                            
+        except Exception as e:
+            logger.error(f"Error streaming from AI API: {e}")
+            # Once tokens were sent the response can't be replaced: fail the stream so the
+            # client gets an error instead of an answer that looks complete
+            if streamed_any or not fallback:
+                raise
+            yield self._fallback_response(context, question, graph)
     
-    def _fallback_response(self, context: str, question: str) -> str:
-        """Fallback response when AI API is not available"""
+    def _fallback_response(self, context: str, question: str, graph: Optional[CodeGraph] = None) -> str:
+        """Fallback response when AI API is not available, with counts from the code graph"""
         question_lower = question.lower()
-        file_count = context.count("File: ")
-        func_count = context.count("def ")
-        class_count = context.count("class ")
-        import_count = context.count("import ")
+        if graph is None:
+            file_count = context.count("File: ")
+            return f"I can help analyze your repository with {file_count} source files. Ask about specific files, functions, classes, or structure."
+
+        stats = graph.stats()
+        definitions = stats['definitions']
+        file_count = stats['files']
         
         if "main.py" in question_lower:
             return "Your repository contains main.py. It appears to be the main entry point of your application."
         elif "function" in question_lower:
-            return f"I found approximately {func_count} functions across all Python files."
+            return f"I found {definitions.get('function', 0)} functions and {definitions.get('method', 0)} methods across {file_count} source files."
         elif "class" in question_lower:
-            return f"I found approximately {class_count} classes across all Python files."
+            return f"I found {definitions.get('class', 0)} classes and {definitions.get('type', 0)} other types across {file_count} source files."
         elif "import" in question_lower or "dependencies" in question_lower:
-            return f"There are approximately {import_count} import statements in the repository."
+            external = stats['external_modules']
+            listed = f": {', '.join(external[:20])}" + (", ..." if len(external) > 20 else "") if external else ""
+            return f"There are {stats['imports']} imports between files of the repository, and it uses {len(external)} external modules{listed}."
         elif "summary" in question_lower or "overview" in question_lower or "all files" in question_lower:
-            return f"The repository has {file_count} Python files. It contains various modules and components."
+            languages = ", ".join(f"{count} {language}" for language, count in sorted(stats['languages'].items()))
+            return f"The repository has {file_count} source files ({languages}). It contains various modules and components."
         else:
-            return f"I can help analyze your repository with {file_count} Python files. Ask about specific files, functions, classes, or structure."
+            return f"I can help analyze your repository with {file_count} source files. Ask about specific files, functions, classes, or structure."
+
+def _count_usage(usage: Optional[Dict[str, Any]]):
+    """Add the token usage reported by the completion API to the metrics"""
+    if not usage:
+        return
+    COMPLETION_TOKENS.inc(usage.get("prompt_tokens") or 0, kind="prompt")
+    COMPLETION_TOKENS.inc(usage.get("completion_tokens") or 0, kind="completion")
 
 # Global service instance
 ai_service = AIService()
 
 embedding_service = EmbeddingService()
 
-async def generate_ai_response(repo: Dict[str, Any], message: str, all_files: bool = False) -> Dict[str, Any]:
+documentation_pipeline = DocumentationPipeline(ai_service)
+
+def _context_result(builder: ContextBuilder, relevant_files: List[str], dropped_files: List[str]) -> Dict[str, Any]:
+    context = builder.build()
+    logger.info(
+        f"Prompt context: ~{builder.tokens} tokens from {len(relevant_files)} files, "
+        f"{len(dropped_files)} files dropped to fit the {builder.budget} token budget"
+    )
+    return {
+        "context": context,
+        "relevant_files": relevant_files,
+        "prompt_tokens": builder.tokens,
+        "dropped_files": dropped_files
+    }
+
+MAX_SYMBOL_MATCHES = 10
+# Definitions calling or called by the retrieved code that are added to the context
+MAX_RELATED_DEFINITIONS = int(os.getenv("GRAPH_RELATED_DEFINITIONS", 5))
+
+async def load_code_graph(repo: Dict[str, Any]) -> CodeGraph:
+    """The repository's code graph, built in a worker thread if it isn't stored yet"""
+    if repo.get('code_graph') is not None:
+        return repo['code_graph']
+    return await asyncio.to_thread(get_code_graph, repo)
+
+async def _add_related_definitions(builder: ContextBuilder, repo: Dict[str, Any], anchors: List[Tuple[str, str]]) -> List[str]:
+    """Add the chunks of definitions that the anchor definitions (file, qualname) call or are
+    called by, as far as the budget allows. Returns the files they come from.
     """
-    Generate AI response for repository chat.
-    If all_files is True, uses the entire repo as context.
-    Otherwise, it uses embeddings to find relevant chunks.
+    if MAX_RELATED_DEFINITIONS <= 0 or not anchors:
+        return []
+    graph = await load_code_graph(repo)
+
+    related = []
+    for path, qualname in anchors:
+        for index in graph.neighbours(path, qualname):
+            definition = graph.definition(index)
+            key = (definition['file'], definition['qualname'])
+            if key not in anchors and key not in related:
+                related.append(key)
+    related = related[:MAX_RELATED_DEFINITIONS]
+    if not related:
+        return []
+
+    wanted = set(related)
+    chunks = {}
+    for chunk in repo['chunks']:
+        key = (chunk['file'], chunk['qualname'])
+        if key in wanted and key not in chunks:
+            chunks[key] = chunk
+
+    header = "Related definitions (calling or called by the code above):\n\n"
+    files = []
+    header_added = False
+    for key in related:
+        chunk = chunks.get(key)
+        if chunk is None:
+            continue
+        section = (
+            f"File: {chunk['file']} ({chunk['kind']} {chunk['qualname']}, lines {chunk['start_line']}-{chunk['end_line']})\n"
+            f"Content:\n{chunk['content']}\n\n"
+        )
+        if not header_added:
+            # Related code is optional: skip it rather than crowd out the snippets above
+            if not builder.fits(estimate_tokens(header) + estimate_tokens(section)):
+                continue
+            builder.add(header)
+            header_added = True
+        if builder.add(section) and chunk['file'] not in files:
+            files.append(chunk['file'])
+    return files
+
+async def _symbol_context(builder: ContextBuilder, repo: Dict[str, Any], symbols: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Context made of the definitions of the symbols named in a question, found via the symbol index"""
+    builder.add("Here are the definitions named in your question:\n\n")
+    relevant_file_paths = []
+    dropped = []
+
+    for symbol in symbols[:MAX_SYMBOL_MATCHES]:
+        # A class brings its methods along
+        nested_prefix = f"{symbol['qualname']}." if symbol['kind'] == 'class' else None
+        for chunk in repo['chunks']:
+            if chunk['file'] != symbol['file']:
+                continue
+            if chunk['qualname'] != symbol['qualname'] and not (nested_prefix and chunk['qualname'].startswith(nested_prefix)):
+                continue
+            added = builder.add(
+                f"File: {chunk['file']} ({chunk['kind']} {chunk['qualname']}, lines {chunk['start_line']}-{chunk['end_line']})\n"
+                f"Content:\n{chunk['content']}\n\n"
+            )
+            target = relevant_file_paths if added else dropped
+            if chunk['file'] not in target:
+                target.append(chunk['file'])
+
+    logger.info(f"Answered from symbol index: {', '.join(s['qualname'] for s in symbols[:MAX_SYMBOL_MATCHES])}")
+    anchors = [(s['file'], s['qualname']) for s in symbols[:MAX_SYMBOL_MATCHES]]
+    for path in await _add_related_definitions(builder, repo, anchors):
+        if path not in relevant_file_paths:
+            relevant_file_paths.append(path)
+    return _context_result(builder, relevant_file_paths, [p for p in dropped if p not in relevant_file_paths])
+
+# Seconds before a repository whose vector index couldn't be built is tried again
+INDEX_REBUILD_BACKOFF = float(os.getenv("INDEX_REBUILD_BACKOFF_SECONDS", 300))
+
+# Vector index rebuilds in progress and failed ones' retry times, by repository id
+_index_rebuilds: Dict[str, asyncio.Task] = {}
+_index_retry_at: Dict[str, float] = {}
+
+def schedule_index_rebuild(repo: Dict[str, Any]):
+    """Start building the missing vector index of a repository in the background.
+
+    One rebuild per repository runs at a time, in the background lane, and after a
+    failure the repository isn't tried again for INDEX_REBUILD_BACKOFF seconds. The
+    result is stored as a new version of the repository, leaving the loaded one untouched.
     """
-    context = f"Repository: {repo['name']}\n"
-    relevant_file_paths = set()
-    
-    # List .py files in the repo
-    py_files = [file_info['path'] for file_info in repo['files'] if file_info['path'].endswith('.py')]
+    repo_id = repo['id']
+    if repo_id in _index_rebuilds or time.monotonic() < _index_retry_at.get(repo_id, 0):
+        return
+    _index_rebuilds[repo_id] = asyncio.ensure_future(_rebuild_index(repo))
+
+async def _rebuild_index(repo: Dict[str, Any]):
+    repo_id = repo['id']
+    try:
+        index = await embedding_service.build_index(repo['files'], priority=BACKGROUND, key=repo_id)
+        if index['vector_index'] is None:
+            _index_retry_at[repo_id] = time.monotonic() + INDEX_REBUILD_BACKOFF
+            return
+        if await asyncio.to_thread(repository_store.save_index, {**repo, **index}):
+            logger.info(f"Rebuilt the vector index of repository {repo_id}")
+        _index_retry_at.pop(repo_id, None)
+    except Exception as e:
+        logger.warning(f"Could not rebuild the vector index of repository {repo_id}: {e}")
+        _index_retry_at[repo_id] = time.monotonic() + INDEX_REBUILD_BACKOFF
+    finally:
+        del _index_rebuilds[repo_id]
+
+async def build_chat_context(repo: Dict[str, Any], message: str, all_files: bool = False) -> Dict[str, Any]:
+    """
+    Build the prompt context for a chat question within the context token budget.
+    If all_files is True, uses the entire repo as context, upgrading the files that best
+    match the question from outlines to full content first.
+    Otherwise, definitions named in the question are looked up in the symbol index, and
+    failing that the most relevant chunks are retrieved by combining BM25 and embedding
+    scores (BM25 alone without an API key).
+    Returns the context with the files it draws on, its size and any dropped files.
+    """
+    builder = ContextBuilder(f"Repository: {repo['name']}\n")
+
+    # Questions naming specific functions or classes are answered from their definitions directly
+    with stage_timer("symbol_lookup"):
+        symbols = [] if all_files else lookup_symbols(repo.get('symbols') or {}, message)
+    if symbols:
+        return await _symbol_context(builder, repo, symbols)
+
+    if all_files:
+        # Build context from all repository files for summary questions
+        builder.add(f"Total files: {repo['file_count']}\n\n")
+        selection = builder.add_files(repo['files'], rank_files_by_query(repo['files'], message))
+        return _context_result(builder, selection['included'] + selection['outlined'], selection['dropped'])
 
-    if all_files or not ai_service.api_key:
-        # Build context from all repository files for summary or if in fallback mode
-        context += f"Total files: {repo['file_count']}\n\n"
+    try:
+        if embedding_service.client and repo.get('vector_index') is None:
+            # Index missing (e.g. embeddings were unavailable at upload time): build it in the
+            # background and answer from BM25 alone until it is stored
+            schedule_index_rebuild(repo)
+
+        with stage_timer("retrieval"):
+            relevant_chunks = await search_chunks(repo, message, top_k=5, embedding_service=embedding_service)
         
-        for file_info in repo['files']:
-            context += f"File: {file_info['path']}\n"
-            context += f"Content:\n{file_info['content']}\n\n"
-            relevant_file_paths.add(file_info['path'])
-    else:
-        # Use embeddings to find relevant context for specific questions
-        try:
-            chunks = await embedding_service.chunk_repository(repo['files'])
-            relevant_chunks = await embedding_service.find_relevant_chunks(chunks, message, top_k=5)
-            
-            if not relevant_chunks:
-                # Fallback to all files if no relevant chunks found
-                logger.info("No relevant chunks found, falling back to full context.")
-                return await generate_ai_response(repo, message, all_files=True)
+        if not relevant_chunks:
+            # Fallback to all files if no relevant chunks found
+            logger.info("No relevant chunks found, falling back to full context.")
+            return await build_chat_context(repo, message, all_files=True)
 
-            context += "Here are the most relevant code snippets based on your question:\n\n"
-            
-            for chunk in relevant_chunks:
-                context += f"File: {chunk['file']} (lines {chunk['start_line']}-{chunk['end_line']})\n"
-                context += f"Content:\n{chunk['content']}\n\n"
-                relevant_file_paths.add(chunk['file'])
-        except Exception as e:
-            logger.error(f"Embedding-based search failed: {e}. Falling back to full context.")
-            # Fallback to all files on any embedding error
-            return await generate_ai_response(repo, message, all_files=True)
-    
-    response_message = await ai_service.generate_response(context, message)
+        builder.add("Here are the most relevant code snippets based on your question:\n\n")
+        
+        relevant_file_paths = []
+        dropped = []
+        for chunk in relevant_chunks:
+            added = builder.add(
+                f"File: {chunk['file']} ({chunk['kind']} {chunk['qualname']}, lines {chunk['start_line']}-{chunk['end_line']})\n"
+                f"Content:\n{chunk['content']}\n\n"
+            )
+            target = relevant_file_paths if added else dropped
+            if chunk['file'] not in target:
+                target.append(chunk['file'])
+
+        anchors = [(chunk['file'], chunk['qualname']) for chunk in relevant_chunks]
+        for path in await _add_related_definitions(builder, repo, anchors):
+            if path not in relevant_file_paths:
+                relevant_file_paths.append(path)
+        dropped = [path for path in dropped if path not in relevant_file_paths]
+        
+        return _context_result(builder, relevant_file_paths, dropped)
+    except Exception as e:
+        logger.error(f"Chunk retrieval failed: {e}. Falling back to full context.")
+        # Fallback to all files on any retrieval error
+        return await build_chat_context(repo, message, all_files=True)
+
+def _file_list_suffix(repo: Dict[str, Any]) -> str:
+    """List of the repository's source files appended to every chat answer"""
+    paths = [file_info['path'] for file_info in repo['files']]
+    if not paths:
+        return ""
+    return f"\n\nHere are some of the source files in this repository: {', '.join(paths)}"
+
+def _chat_cache_key(repo: Dict[str, Any], message: str, all_files: bool = False) -> Tuple:
+    # Answers retrieved with BM25 alone (vectors missing or being rebuilt) aren't reused once
+    # the vectors are there
+    hybrid = bool(embedding_service.client) and repo.get('vector_index') is not None
+    return (repository_hash(repo), "chat", normalize_question(message), ai_service.model, all_files, hybrid)
+
+async def answer_from_code_graph(repo: Dict[str, Any], message: str) -> Optional[Dict[str, Any]]:
+    """Answer structural questions (what calls X, what does module Y depend on) from the code
+    graph without calling the AI API, or return None for any other question
+    """
+    graph = await load_code_graph(repo)
+    with stage_timer("graph_query"):
+        answer = answer_structural_question(graph, message)
+    if answer is None:
+        return None
+    text, files = answer
+    logger.info(f"Answered from code graph: {message!r}")
+    return {"message": text, "relevant_files": files, "prompt_tokens": 0, "dropped_files": 0}
+
+async def generate_ai_response(repo: Dict[str, Any], message: str, all_files: bool = False) -> Dict[str, Any]:
+    """Generate AI response for repository chat, reusing the answer to the same question about the same code.
+
+    Structural questions are answered from the code graph without calling the AI API.
+    """
+    if not all_files:
+        structural = await answer_from_code_graph(repo, message)
+        if structural is not None:
+            return structural
+
+    async def compute():
+        with stage_timer("context"):
+            prompt = await build_chat_context(repo, message, all_files)
+        CONTEXT_TOKENS.observe(prompt["prompt_tokens"], kind="chat")
+
+        response_message = await ai_service.complete(prompt["context"], message, INTERACTIVE, repo['id'])
+        # Fallback answers are only used while the API is unavailable, don't cache them
+        cacheable = response_message is not None
+        if response_message is None:
+            response_message = ai_service._fallback_response(prompt["context"], message, await load_code_graph(repo))
 
-    if py_files:
         # Add list of files at the end of the message
-        response_message += f"\n\nHere are some of the Python files in this repository: {', '.join(py_files)}"
+        response_message += _file_list_suffix(repo)
 
-    return {
-        "message": response_message,
-        "relevant_files": list(relevant_file_paths)
-    }
+        return {
+            "message": response_message,
+            "relevant_files": prompt["relevant_files"],
+            "prompt_tokens": prompt["prompt_tokens"],
+            "dropped_files": len(prompt["dropped_files"])
+        }, cacheable
 
-async def generate_documentation(repo: Dict[str, Any]) -> str:
-    """Generate documentation for the repository"""
+    return await response_cache.get_or_compute(_chat_cache_key(repo, message, all_files), compute)
 
-    
-    context = f"Repository: {repo['name']}\n"
-    for file_info in repo['files']:
-        context += f"File: {file_info['path']}\n{file_info['content']}\n\n"
-    
-    question = "Generate comprehensive documentation for this Python repository including overview, file descriptions, and usage instructions."
-    
-    return await ai_service.generate_response(context, question)
+async def _replay(text: str) -> AsyncIterator[str]:
+    yield text
+
+async def _stream_answer(
+    stream: StreamedResponse,
+    prompt: Dict[str, Any],
+    question: str,
+    graph: Optional[CodeGraph],
+    priority: str,
+    key: str
+) -> Tuple[str, bool]:
+    """Stream a completion into stream, returning the text and whether it can be cached.
+
+    The fallback answer is sent when the API is unavailable, and isn't cached.
+    """
+    try:
+        async for token in ai_service.stream_response(prompt["context"], question, graph, priority, key, fallback=False):
+            stream.append(token)
+    except Exception:
+        if stream.tokens:
+            raise
+        stream.append(ai_service._fallback_response(prompt["context"], question, graph))
+        return "".join(stream.tokens), False
+    return "".join(stream.tokens), True
+
+async def stream_ai_response(repo: Dict[str, Any], message: str) -> Tuple[Dict[str, Any], AsyncIterator[str]]:
+    """Streaming variant of generate_ai_response.
+
+    Context is assembled up front so the relevant files are known before the first token;
+    returns the relevant_files, prompt_tokens and dropped_files count (as in the
+    generate_ai_response result) with an iterator over the response text.
+    Cached answers and answers from the code graph are sent as a single token; concurrent
+    identical questions follow one stream, and the finished answer is cached.
+    """
+    structural = await answer_from_code_graph(repo, message)
+    if structural is not None:
+        details = {key: structural[key] for key in ("relevant_files", "prompt_tokens", "dropped_files")}
+        return details, _replay(structural["message"])
+
+    async def compute(stream: StreamedResponse):
+        with stage_timer("context"):
+            prompt = await build_chat_context(repo, message)
+        CONTEXT_TOKENS.observe(prompt["prompt_tokens"], kind="chat")
+        details = {
+            "relevant_files": prompt["relevant_files"],
+            "prompt_tokens": prompt["prompt_tokens"],
+            "dropped_files": len(prompt["dropped_files"])
+        }
+        stream.details.set_result(details)
+
+        graph = await load_code_graph(repo)
+        text, cacheable = await _stream_answer(stream, prompt, message, graph, INTERACTIVE, repo['id'])
+        suffix = _file_list_suffix(repo)
+        if suffix:
+            stream.append(suffix)
+        return {"message": text + suffix, **details}, cacheable
+
+    cached, stream = await response_cache.get_or_stream(_chat_cache_key(repo, message), compute)
+    if cached is not None:
+        details = {key: cached[key] for key in ("relevant_files", "prompt_tokens", "dropped_files")}
+        return details, _replay(cached["message"])
+    return await asyncio.shield(stream.details), stream.follow()
+
+DOCUMENTATION_QUESTION = "Generate comprehensive documentation for this repository including overview, file descriptions, and usage instructions."
+
+def build_documentation_context(repo: Dict[str, Any]) -> Dict[str, Any]:
+    """Whole-repository context for documentation, outlining files that don't fit in full"""
+    builder = ContextBuilder(f"Repository: {repo['name']}\n")
+    selection = builder.add_files(repo['files'])
+    return _context_result(builder, selection['included'] + selection['outlined'], selection['dropped'])
+
+async def build_documentation_prompt(repo: Dict[str, Any], mode: str = "auto") -> Dict[str, Any]:
+    """Documentation context for the requested mode.
+
+    "single" sends the repository in one prompt, "pipeline" runs the map-reduce
+    DocumentationPipeline, and "auto" uses the pipeline when the files don't fit the
+    context budget. The pipeline needs the AI API, so without a key it's always "single".
+    """
+    if mode == "auto":
+        repo_tokens = sum(estimate_tokens(f['content']) for f in repo['files'])
+        mode = "pipeline" if repo_tokens > CONTEXT_TOKEN_BUDGET else "single"
+
+    if mode == "pipeline" and ai_service.api_key:
+        with stage_timer("docs_pipeline"):
+            builder, included, dropped = await documentation_pipeline.build_context(repo)
+        return _context_result(builder, included, dropped)
+
+    return build_documentation_context(repo)
+
+def _documentation_cache_key(repo: Dict[str, Any], mode: str) -> Tuple:
+    return (repository_hash(repo), "docs", mode, ai_service.model)
+
+async def generate_documentation(repo: Dict[str, Any], mode: str = "auto") -> Dict[str, Any]:
+    """Generate documentation for the repository, reusing earlier documentation of the same code"""
+
+    async def compute():
+        with stage_timer("context"):
+            prompt = await build_documentation_prompt(repo, mode)
+        CONTEXT_TOKENS.observe(prompt["prompt_tokens"], kind="docs")
+        documentation = await ai_service.complete(prompt["context"], DOCUMENTATION_QUESTION, BACKGROUND, repo['id'])
+        cacheable = documentation is not None
+        if documentation is None:
+            documentation = ai_service._fallback_response(prompt["context"], DOCUMENTATION_QUESTION, await load_code_graph(repo))
+        return {
+            "documentation": documentation,
+            "prompt_tokens": prompt["prompt_tokens"],
+            "dropped_files": len(prompt["dropped_files"])
+        }, cacheable
+
+    return await response_cache.get_or_compute(_documentation_cache_key(repo, mode), compute)
+
+async def stream_documentation(repo: Dict[str, Any], mode: str = "auto") -> Tuple[Dict[str, Any], AsyncIterator[str]]:
+    """Stream generated documentation for the repository token by token.
+
+    In pipeline mode the file and package summaries are generated first; only the final
+    README is streamed. Returns the prompt_tokens and dropped_files count with an iterator
+    over the text; cached documentation is sent as a single token. Concurrent requests
+    follow one stream, and the finished documentation is cached.
+    """
+
+    async def compute(stream: StreamedResponse):
+        with stage_timer("context"):
+            prompt = await build_documentation_prompt(repo, mode)
+        CONTEXT_TOKENS.observe(prompt["prompt_tokens"], kind="docs")
+        details = {"prompt_tokens": prompt["prompt_tokens"], "dropped_files": len(prompt["dropped_files"])}
+        stream.details.set_result(details)
+
+        graph = await load_code_graph(repo)
+        text, cacheable = await _stream_answer(stream, prompt, DOCUMENTATION_QUESTION, graph, BACKGROUND, repo['id'])
+        return {"documentation": text, **details}, cacheable
+
+    cached, stream = await response_cache.get_or_stream(_documentation_cache_key(repo, mode), compute)
+    if cached is not None:
+        details = {key: cached[key] for key in ("prompt_tokens", "dropped_files")}
+        return details, _replay(cached["documentation"])
+    return await asyncio.shield(stream.details), stream.follow()
@@ -0,0 +1,345 @@
+import ast
+import os
+import re
+from pathlib import PurePosixPath
+from typing import List, Dict, Any, Callable, Optional, Pattern, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Chunks longer than this are split into consecutive parts
+MAX_CHUNK_CHARS = int(os.getenv("CHUNK_MAX_CHARS", 4000))
+# Very small chunks are unlikely to be useful
+MIN_CHUNK_CHARS = 20
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+_IDENTIFIER = re.compile(r"`([^`]+)`|([A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)(\s*\()?")
+
+# Plain words that are too generic to look up as symbol names
+_STOPWORDS = {
+    "a", "an", "and", "are", "can", "class", "code", "def", "do", "does", "explain", "file",
+    "files", "for", "from", "function", "functions", "how", "in", "is", "it", "me", "method",
+    "methods", "module", "of", "on", "or", "repo", "repository", "tell", "the", "this", "to",
+    "what", "when", "where", "which", "who", "why", "with", "work", "works"
+}
+
+
+def module_name(path: str) -> str:
+    """Dotted module name for a file path, e.g. app/services/utils.py -> app.services.utils"""
+    parts = list(PurePosixPath(path).with_suffix("").parts)
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def _split_lines(path: str, lines: List[str], start_line: int, info: Dict[str, Any], max_chars: int) -> List[Dict[str, Any]]:
+    """Turn a run of source lines into one chunk, or several consecutive parts if it is too long"""
+    chunks = []
+    current = []
+    current_start = start_line
+    size = 0
+
+    def flush(end_line):
+        content = '\n'.join(current).strip()
+        if len(content) > MIN_CHUNK_CHARS:
+            chunks.append({
+                'file': path,
+                'content': content,
+                'start_line': current_start,
+                'end_line': end_line,
+                **info
+            })
+
+    for offset, line in enumerate(lines):
+        line_no = start_line + offset
+        if current and size + len(line) + 1 > max_chars:
+            flush(line_no - 1)
+            current = []
+            current_start = line_no
+            size = 0
+        current.append(line)
+        size += len(line) + 1
+
+    if current:
+        flush(start_line + len(lines) - 1)
+
+    if len(chunks) > 1:
+        for part, chunk in enumerate(chunks, start=1):
+            chunk['part'] = part
+    return chunks
+
+
+def _chunk_by_lines(path: str, content: str, max_chars: int) -> List[Dict[str, Any]]:
+    """Fallback for files that don't parse: size-capped windows of lines"""
+    lines = content.split('\n')
+    return _split_lines(path, lines, 1, {'qualname': module_name(path), 'kind': 'module'}, max_chars)
+
+
+def chunk_python_file(path: str, content: str, max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split one Python file into chunks using its syntax tree.
+
+    Every function and method becomes its own chunk (decorators included). A class chunk
+    keeps the class header, docstring and attributes but not its methods, and module-level
+    code between definitions is grouped into module chunks. Returns the chunks and the
+    symbols (one per definition, with its full line range) for the symbol index.
+    """
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        logger.debug(f"Could not parse {path}, chunking by lines")
+        return _chunk_by_lines(path, content, max_chars), []
+
+    lines = content.split('\n')
+    module = module_name(path)
+    chunks = []
+    symbols = []
+
+    def node_start(node) -> int:
+        return min([d.lineno for d in node.decorator_list] + [node.lineno])
+
+    def uncovered_runs(start: int, end: int, nodes) -> List[Tuple[int, int]]:
+        """Line ranges within start..end not taken by any of the given definitions"""
+        runs = []
+        cursor = start
+        for node in nodes:
+            if node_start(node) > cursor:
+                runs.append((cursor, node_start(node) - 1))
+            cursor = max(cursor, node.end_lineno + 1)
+        if cursor <= end:
+            runs.append((cursor, end))
+        return runs
+
+    def emit_runs(runs, info):
+        for run_start, run_end in runs:
+            chunks.extend(_split_lines(path, lines[run_start - 1:run_end], run_start, info, max_chars))
+
+    def visit(body, prefix: str, in_class: bool):
+        for node in body:
+            if not isinstance(node, _DEFINITIONS):
+                continue
+
+            qualname = f"{prefix}{node.name}"
+            start, end = node_start(node), node.end_lineno
+            if isinstance(node, ast.ClassDef):
+                kind = 'class'
+            else:
+                kind = 'method' if in_class else 'function'
+            symbols.append({
+                'name': node.name,
+                'qualname': qualname,
+                'module': module,
+                'kind': kind,
+                'file': path,
+                'start_line': start,
+                'end_line': end
+            })
+            info = {'qualname': qualname, 'kind': kind}
+
+            if isinstance(node, ast.ClassDef):
+                members = [n for n in node.body if isinstance(n, _DEFINITIONS)]
+                emit_runs(uncovered_runs(start, end, members), info)
+                visit(node.body, f"{qualname}.", in_class=True)
+            else:
+                # Nested functions stay inside their enclosing function's chunk
+                emit_runs([(start, end)], info)
+
+    top_level = [n for n in tree.body if isinstance(n, _DEFINITIONS)]
+    emit_runs(uncovered_runs(1, len(lines), top_level), {'qualname': module, 'kind': 'module'})
+    visit(tree.body, "", in_class=False)
+
+    chunks.sort(key=lambda c: c['start_line'])
+    return chunks, symbols
+
+
+# Top-level declarations in brace languages, as (pattern, kind) pairs; the last group is the name
+_TYPESCRIPT_DEFINITIONS = [
+    (re.compile(r"^(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)"), 'class'),
+    (re.compile(r"^(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)"), 'function'),
+    (re.compile(r"^(?:export\s+)?(?:declare\s+)?(?:interface|type|enum)\s+([A-Za-z_$][\w$]*)"), 'type'),
+    (re.compile(r"^(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>)"), 'function'),
+]
+_GO_DEFINITIONS = [
+    (re.compile(r"^func\s+\(\s*(?:\w+\s+)?\*?(\w+)(?:\[[^\]]*\])?\s*\)\s*(\w+)"), 'method'),
+    (re.compile(r"^func\s+(\w+)"), 'function'),
+    (re.compile(r"^type\s+(\w+)"), 'type'),
+]
+
+# String literals and line comments, removed before counting braces
+_BRACE_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*$')
+
+
+def _definition_end(lines: List[str], start: int, limit: int) -> int:
+    """Last line (1-based) of a braced declaration starting at line start, at most limit"""
+    depth = 0
+    opened = False
+    for line_no in range(start, limit + 1):
+        code = _BRACE_NOISE.sub('', lines[line_no - 1])
+        depth += code.count('{') - code.count('}')
+        opened = opened or '{' in code
+        if opened and depth <= 0:
+            return line_no
+        if not opened and (code.rstrip().endswith(';') or (line_no > start and not code.strip())):
+            # A declaration without a body, e.g. a type alias or a forward declaration
+            return line_no if code.strip() else line_no - 1
+    return limit
+
+
+def chunk_braced_file(path: str, content: str, definitions: List[Tuple[Pattern, str]], max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split a C-like source file (TypeScript, JavaScript, Go) at its top-level declarations.
+
+    Declarations are recognised line by line with the language's patterns and extended to
+    their closing brace. Each becomes a chunk and a symbol; code between them is grouped
+    into module chunks, like chunk_python_file does for Python.
+    """
+    lines = content.split('\n')
+    module = module_name(path)
+
+    starts = []
+    for line_no, line in enumerate(lines, start=1):
+        for pattern, kind in definitions:
+            match = pattern.match(line)
+            if match:
+                names = [g for g in match.groups() if g]
+                qualname = '.'.join(names)
+                starts.append((line_no, names[-1], qualname, kind))
+                break
+
+    chunks = []
+    symbols = []
+    cursor = 1
+    for i, (start, name, qualname, kind) in enumerate(starts):
+        # Declarations only match unindented lines, so the next one bounds this one's body
+        # even when its braces don't balance (e.g. inside a multi-line template string)
+        limit = starts[i + 1][0] - 1 if i + 1 < len(starts) else len(lines)
+        end = _definition_end(lines, start, limit)
+
+        if start > cursor:
+            chunks.extend(_split_lines(path, lines[cursor - 1:start - 1], cursor, {'qualname': module, 'kind': 'module'}, max_chars))
+        chunks.extend(_split_lines(path, lines[start - 1:end], start, {'qualname': qualname, 'kind': kind}, max_chars))
+        symbols.append({
+            'name': name,
+            'qualname': qualname,
+            'module': module,
+            'kind': kind,
+            'file': path,
+            'start_line': start,
+            'end_line': end
+        })
+        cursor = end + 1
+
+    if cursor <= len(lines):
+        chunks.extend(_split_lines(path, lines[cursor - 1:], cursor, {'qualname': module, 'kind': 'module'}, max_chars))
+    return chunks, symbols
+
+
+def chunk_typescript_file(path: str, content: str, max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    return chunk_braced_file(path, content, _TYPESCRIPT_DEFINITIONS, max_chars)
+
+
+def chunk_go_file(path: str, content: str, max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    return chunk_braced_file(path, content, _GO_DEFINITIONS, max_chars)
+
+
+def chunk_config_file(path: str, content: str, max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Configuration and build files have no definitions: size-capped windows of lines"""
+    return _split_lines(path, content.split('\n'), 1, {'qualname': module_name(path), 'kind': 'config'}, max_chars), []
+
+
+# Registered languages: name -> chunker and outline pattern; file extension (or exact file name) -> name
+LANGUAGES: Dict[str, Dict[str, Any]] = {}
+_LANGUAGE_BY_EXTENSION: Dict[str, str] = {}
+
+
+def register_language(
+    name: str,
+    extensions: List[str],
+    chunker: Callable[[str, str, int], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]],
+    signature: Optional[Pattern] = None
+):
+    """Add a language: files ending in one of extensions (".go", or a file name like "go.mod")
+    are split with chunker(path, content, max_chars) -> (chunks, symbols). signature matches
+    the lines kept in a file's outline when its full content doesn't fit the prompt.
+    """
+    LANGUAGES[name] = {'name': name, 'chunker': chunker, 'signature': signature}
+    for extension in extensions:
+        _LANGUAGE_BY_EXTENSION[extension.lower()] = name
+
+
+def language_for(path: str) -> Optional[str]:
+    """Name of the registered language a file belongs to, or None if it isn't ingested"""
+    name = PurePosixPath(path).name.lower()
+    if name in _LANGUAGE_BY_EXTENSION:
+        return _LANGUAGE_BY_EXTENSION[name]
+    return _LANGUAGE_BY_EXTENSION.get(PurePosixPath(name).suffix)
+
+
+register_language('python', ['.py', '.pyi'], chunk_python_file, re.compile(r"^\s*(async\s+def|def|class)\s"))
+register_language(
+    'typescript', ['.ts', '.tsx', '.mts', '.cts', '.js', '.jsx', '.mjs', '.cjs'], chunk_typescript_file,
+    re.compile(r"^\s*(export\s+)?(default\s+)?(declare\s+)?(abstract\s+)?(async\s+)?(function|class|interface|type|enum)\b")
+)
+register_language('go', ['.go'], chunk_go_file, re.compile(r"^(func|type)\s"))
+register_language(
+    'config',
+    ['.json', '.yaml', '.yml', '.toml', '.ini', '.cfg', '.conf', 'go.mod', 'dockerfile', 'makefile'],
+    chunk_config_file,
+    # Top-level keys and sections
+    re.compile(r"^[^\s#;/}\]]")
+)
+
+
+def chunk_file(path: str, content: str, max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Chunk one file with its language's chunker (by lines if the language is unknown)"""
+    language = LANGUAGES.get(language_for(path))
+    if language is None:
+        return _chunk_by_lines(path, content, max_chars), []
+    return language['chunker'](path, content, max_chars)
+
+
+def chunk_files(repo_files: List[Dict[str, Any]], max_chars: int = MAX_CHUNK_CHARS) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """Chunk every repository file and build the symbol index.
+
+    The symbol index maps a definition's name, qualified name (Class.method) and dotted
+    module path (package.module.Class.method) to where it is defined.
+    """
+    chunks = []
+    symbol_index = {}
+
+    for file_info in repo_files:
+        file_chunks, symbols = chunk_file(file_info['path'], file_info['content'], max_chars)
+        chunks.extend(file_chunks)
+        for symbol in symbols:
+            keys = {symbol['name'], symbol['qualname'], f"{symbol['module']}.{symbol['qualname']}"}
+            for key in keys:
+                symbol_index.setdefault(key, []).append(symbol)
+
+    return chunks, symbol_index
+
+
+def lookup_symbols(symbol_index: Dict[str, List[Dict[str, Any]]], text: str) -> List[Dict[str, Any]]:
+    """Find definitions named in a question.
+
+    Backticked names, calls like name() and identifier-shaped words (snake_case, CamelCase,
+    dotted.paths) are looked up as-is; plain words only if they aren't generic English.
+    """
+    found = []
+    seen = set()
+
+    for match in _IDENTIFIER.finditer(text):
+        quoted, word, call = match.groups()
+        candidate = (quoted or word or "").strip().rstrip("()")
+        if not candidate or candidate not in symbol_index:
+            continue
+
+        identifier_like = bool(quoted or call) or "_" in candidate or "." in candidate \
+            or any(c.isupper() for c in candidate[1:]) or any(c.isdigit() for c in candidate)
+        if not identifier_like and (candidate.lower() in _STOPWORDS or len(candidate) < 3):
+            continue
+
+        for symbol in symbol_index[candidate]:
+            key = (symbol['file'], symbol['qualname'])
+            if key not in seen:
+                seen.add(key)
+                found.append(symbol)
+
+    return found
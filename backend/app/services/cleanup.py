@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any
+import logging
+
+from app.services.utils import UPLOAD_TEMP_DIR, clean_temp_directory
+
+logger = logging.getLogger(__name__)
+
+# How often the background sweeper runs
+CLEANUP_INTERVAL_SECONDS = float(os.getenv("CLEANUP_INTERVAL_SECONDS", 300))
+# Staged uploads older than this were left behind by a crashed worker
+UPLOAD_TEMP_MAX_AGE_SECONDS = float(os.getenv("UPLOAD_TEMP_MAX_AGE_MINUTES", 60)) * 60
+
+
+def clean_stale_uploads(max_age: float = UPLOAD_TEMP_MAX_AGE_SECONDS) -> int:
+    """Remove staged uploads older than max_age seconds, returning how many were removed"""
+    if not os.path.isdir(UPLOAD_TEMP_DIR):
+        return 0
+
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(UPLOAD_TEMP_DIR):
+        try:
+            if entry.stat().st_mtime > cutoff:
+                continue
+            if entry.is_dir():
+                clean_temp_directory(entry.path)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        except OSError as e:
+            logger.warning(f"Could not remove stale upload {entry.path}: {e}")
+    return removed
+
+
+def temp_usage() -> Dict[str, Any]:
+    """Number and total size of the staged uploads"""
+    files = 0
+    size = 0
+    if os.path.isdir(UPLOAD_TEMP_DIR):
+        for root, _, names in os.walk(UPLOAD_TEMP_DIR):
+            for name in names:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                    files += 1
+                except OSError:
+                    continue
+    return {"upload_temp_files": files, "upload_temp_bytes": size}
+
+
+def sweep(repository_store) -> Dict[str, int]:
+    """One cleanup pass: evict repositories over their TTL or budgets, prune old jobs and stale uploads"""
+    result = {
+        "repositories_evicted": len(repository_store.evict()),
+        "jobs_pruned": repository_store.prune_jobs(),
+        "uploads_removed": clean_stale_uploads()
+    }
+    if any(result.values()):
+        logger.info(f"Cleanup: {result}")
+    return result
+
+
+async def run_periodic_cleanup(repository_store, interval: float = CLEANUP_INTERVAL_SECONDS):
+    """Background task running sweep every interval seconds until cancelled"""
+    while True:
+        try:
+            await asyncio.to_thread(sweep, repository_store)
+        except Exception as e:
+            logger.error(f"Cleanup failed: {e}")
+        await asyncio.sleep(interval)
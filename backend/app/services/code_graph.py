@@ -0,0 +1,623 @@
+import ast
+import builtins
+import posixpath
+import re
+from collections import defaultdict
+from pathlib import PurePosixPath
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import logging
+
+from app.services.chunker import chunk_files, language_for, module_name
+from app.services.worker_pool import PARALLEL_MIN_FILES, map_batches, split_batches
+
+logger = logging.getLogger(__name__)
+
+# Entries listed per answer to a structural question
+MAX_LISTED = 50
+
+_PYTHON_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+# Calls in C-like languages: a name or dotted name followed by an opening parenthesis
+_CALL = re.compile(r"(?<![\w$.])((?:[A-Za-z_$][\w$]*\.)*[A-Za-z_$][\w$]*)\s*\(")
+_CALL_KEYWORDS = {
+    "if", "for", "while", "switch", "catch", "return", "function", "typeof", "await", "new", "super",
+    "import", "require", "func", "go", "defer", "select", "make", "len", "cap", "append", "panic",
+    "constructor", "async", "yield", "delete", "void", "in", "of", "instanceof", "with", "else", "case",
+}
+# Strings and line comments, removed before looking for calls
+_CODE_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*$')
+
+_TS_IMPORT = re.compile(
+    r"\b(?:import|export)\s+(?:type\s+)?([\w$\s{},*]+?)\s+from\s+['\"]([^'\"]+)['\"]"
+    r"|\bimport\s+['\"]([^'\"]+)['\"]"
+    r"|(?:\b(?:const|let|var)\s+([\w${},:\s]+?)\s*=\s*)?\brequire\(\s*['\"]([^'\"]+)['\"]\s*\)"
+)
+_TS_EXTENSIONS = ['', '.ts', '.tsx', '.d.ts', '.js', '.jsx', '.mjs', '.cjs', '/index.ts', '/index.tsx', '/index.js']
+_GO_IMPORT_BLOCK = re.compile(r"^import\s*\(\s*$(.*?)^\)", re.M | re.S)
+_GO_IMPORT_LINE = re.compile(r"^\s*(?:import\s+)?([\w.]+\s+)?\"([^\"]+)\"", re.M)
+_GO_MODULE = re.compile(r"^module\s+(\S+)", re.M)
+
+# Method names too common to link to a repository definition when the receiver is unknown
+_COMMON_METHODS = {
+    "get", "set", "add", "put", "pop", "run", "map", "keys", "items", "values", "update", "append",
+    "extend", "insert", "remove", "clear", "copy", "join", "split", "strip", "format", "read", "write",
+    "close", "open", "send", "start", "stop", "then", "catch", "filter", "push", "find", "sort",
+    "encode", "decode", "load", "loads", "dump", "dumps", "info", "debug", "warning", "error", "log",
+    "string", "print", "println", "printf", "sprintf", "errorf", "has", "delete", "next", "emit",
+}
+# Called by bare name in Python, these are the builtins unless the file defines or imports them
+_PYTHON_BUILTINS = set(dir(builtins))
+
+
+def _dotted(node: ast.AST) -> Optional[str]:
+    """foo, self.foo or module.Class.method for a call target, None for anything else"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+def _python_facts(content: str) -> Dict[str, Any]:
+    """Imports and, per definition, the names it calls ('' is module-level code)"""
+    tree = ast.parse(content)
+    imports = []
+    calls = defaultdict(list)
+
+    def collect(node: ast.AST, owner: str):
+        for child in ast.walk(node):
+            if isinstance(child, ast.Call):
+                name = _dotted(child.func)
+                if name:
+                    calls[owner].append(name)
+
+    def visit(body, prefix: str, owner: str):
+        for node in body:
+            if isinstance(node, _PYTHON_DEFINITIONS):
+                qualname = f"{prefix}{node.name}"
+                # Decorators and base classes are evaluated in the enclosing scope
+                for expr in node.decorator_list + getattr(node, 'bases', []):
+                    collect(expr, owner)
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, f"{qualname}.", qualname)
+                else:
+                    # Nested functions belong to their enclosing function, as in the chunks
+                    for statement in node.body:
+                        collect(statement, qualname)
+            else:
+                collect(node, owner)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.append((alias.name, {alias.asname or alias.name: None}))
+        elif isinstance(node, ast.ImportFrom):
+            spec = "." * node.level + (node.module or "")
+            imports.append((spec, {alias.asname or alias.name: alias.name for alias in node.names}))
+
+    visit(tree.body, "", "")
+    return {'imports': imports, 'calls': dict(calls)}
+
+
+def _owner_lines(line_count: int, definitions: List[Tuple[str, int, int]]) -> List[str]:
+    """Qualified name of the innermost definition containing each line ('' outside all of them)"""
+    owners = [''] * (line_count + 1)
+    for qualname, start, end in sorted(definitions, key=lambda d: (d[1], -d[2])):
+        for line_no in range(start, min(end, line_count) + 1):
+            owners[line_no] = qualname
+    return owners
+
+
+def _regex_calls(content: str, definitions: List[Tuple[str, int, int]]) -> Dict[str, List[str]]:
+    lines = content.split('\n')
+    owners = _owner_lines(len(lines), definitions)
+    calls = defaultdict(list)
+    for line_no, line in enumerate(lines, start=1):
+        for match in _CALL.finditer(_CODE_NOISE.sub('', line)):
+            name = match.group(1)
+            if name.split('.')[0] not in _CALL_KEYWORDS:
+                calls[owners[line_no]].append(name)
+    return dict(calls)
+
+
+def _typescript_facts(content: str, definitions: List[Tuple[str, int, int]]) -> Dict[str, Any]:
+    imports = []
+    for match in _TS_IMPORT.finditer(content):
+        clause, spec, side_effect, required, required_spec = match.groups()
+        spec = spec or side_effect or required_spec
+        clause = clause or required or ""
+        aliases = {}
+        for part in re.findall(r"\*\s*as\s+([\w$]+)|\{([^}]*)\}|([\w$]+)", clause):
+            namespace, named, default = part
+            if namespace:
+                aliases[namespace] = None
+            elif named:
+                for item in named.split(','):
+                    pieces = re.split(r"\s+as\s+|\s*:\s*", item.strip())
+                    if pieces[0] and pieces[0] != 'type':
+                        aliases[pieces[-1]] = pieces[0]
+            elif default and default != 'type':
+                # A default import or a whole require()d module
+                aliases[default] = None if required_spec else 'default'
+        imports.append((spec, aliases))
+    return {'imports': imports, 'calls': _regex_calls(content, definitions)}
+
+
+def _go_facts(content: str, definitions: List[Tuple[str, int, int]]) -> Dict[str, Any]:
+    imports = []
+    blocks = [m.group(1) for m in _GO_IMPORT_BLOCK.finditer(content)]
+    single = [line for line in content.split('\n') if line.startswith('import ') and '(' not in line]
+    for alias, spec in _GO_IMPORT_LINE.findall('\n'.join(blocks + single)):
+        alias = alias.strip() or spec.rsplit('/', 1)[-1]
+        if alias != '_':
+            imports.append((spec, {'*': '*'} if alias == '.' else {alias: None}))
+    return {'imports': imports, 'calls': _regex_calls(content, definitions)}
+
+
+def file_facts(path: str, content: str, definitions: List[Tuple[str, int, int]]) -> Dict[str, Any]:
+    """Unresolved imports and calls of one file, per its language (empty for config files)"""
+    language = language_for(path)
+    try:
+        if language == 'python':
+            return _python_facts(content)
+        if language == 'typescript':
+            return _typescript_facts(content, definitions)
+        if language == 'go':
+            return _go_facts(content, definitions)
+    except (SyntaxError, ValueError):
+        logger.debug(f"Could not parse {path} for the code graph")
+    return {'imports': [], 'calls': {}}
+
+
+def _facts_batch(files: List[Tuple[str, str, List[Tuple[str, int, int]]]]) -> List[Dict[str, Any]]:
+    return [file_facts(path, content, definitions) for path, content, definitions in files]
+
+
+class _Resolver:
+    """Resolves import specs and called names to repository files and definitions"""
+
+    def __init__(self, paths: List[str], definitions: List[List[Any]]):
+        self.paths = paths
+        self.file_index = {path: i for i, path in enumerate(paths)}
+        self.definitions = definitions
+
+        # Python modules by every dotted suffix, since archives usually add a top-level folder
+        self.python_modules = defaultdict(list)
+        # Go packages by directory, and go.mod module paths with their directories
+        self.go_packages = defaultdict(list)
+        self.go_modules = []
+        for i, path in enumerate(paths):
+            language = language_for(path)
+            if language == 'python':
+                parts = module_name(path).split('.')
+                for k in range(len(parts)):
+                    self.python_modules['.'.join(parts[k:])].append(i)
+            elif language == 'go':
+                self.go_packages[posixpath.dirname(path)].append(i)
+
+        self.by_file = defaultdict(dict)
+        self.by_name = defaultdict(list)
+        for d, (file, qualname, kind, _, _) in enumerate(definitions):
+            if kind == 'module':
+                continue
+            self.by_file[file][qualname] = d
+            self.by_name[qualname.rsplit('.', 1)[-1]].append(d)
+
+    def add_go_module(self, path: str, content: str):
+        match = _GO_MODULE.search(content)
+        if match:
+            self.go_modules.append((match.group(1), posixpath.dirname(path)))
+
+    def _closest(self, candidates: List[int], importer: int) -> List[int]:
+        """The candidate file sharing the longest directory prefix with the importer"""
+        if len(candidates) <= 1:
+            return candidates
+        base = self.paths[importer]
+        return [max(candidates, key=lambda c: len(posixpath.commonprefix([self.paths[c], base])))]
+
+    def python_module(self, spec: str, importer: int) -> List[int]:
+        if spec.startswith('.'):
+            level = len(spec) - len(spec.lstrip('.'))
+            package = module_name(self.paths[importer]).split('.')
+            if not self.paths[importer].endswith('__init__.py'):
+                package = package[:-1]
+            package = package[:len(package) - (level - 1)] if level > 1 else package
+            spec = '.'.join(package + ([spec.lstrip('.')] if spec.lstrip('.') else []))
+        return self._closest(self.python_modules.get(spec, []), importer)
+
+    def typescript_module(self, spec: str, importer: int) -> List[int]:
+        if not spec.startswith('.'):
+            return []
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(self.paths[importer]), spec))
+        stem = re.sub(r"\.(js|jsx|mjs|cjs)$", "", base)
+        for candidate in [base] + [stem + extension for extension in _TS_EXTENSIONS]:
+            if candidate in self.file_index:
+                return [self.file_index[candidate]]
+        return []
+
+    def go_package(self, spec: str, importer: int) -> List[int]:
+        for module, directory in self.go_modules:
+            if spec == module or spec.startswith(module + '/'):
+                return self.go_packages.get(posixpath.normpath(posixpath.join(directory, spec[len(module):].lstrip('/'))), [])
+        # Without go.mod: match the import path's trailing directories
+        matches = [d for d in self.go_packages if d == spec or d.endswith('/' + spec)]
+        return self.go_packages[matches[0]] if len(matches) == 1 else []
+
+    def resolve_imports(self, file: int, imports: List[Tuple[str, Dict[str, Optional[str]]]]):
+        """Import edges, external module names and an alias table for one file.
+
+        aliases maps a local name to (files, None) for a module or (files, name) for a
+        definition; star lists the files whose names are all imported.
+        """
+        language = language_for(self.paths[file])
+        targets, external = set(), set()
+        aliases: Dict[str, Tuple[List[int], Optional[str]]] = {}
+        star: List[int] = []
+
+        for spec, names in imports:
+            if language == 'python':
+                files = self.python_module(spec, file)
+                for alias, name in names.items():
+                    if name == '*':
+                        star.extend(files)
+                    elif name is None:
+                        # import a.b.c is keyed by the whole dotted name, as calls spell it out
+                        aliases[alias] = (files, None)
+                    else:
+                        # from package import module, or from module import name
+                        submodule = self.python_module(f"{spec}.{name}" if spec.strip('.') else spec + name, file)
+                        if submodule:
+                            aliases[alias] = (submodule, None)
+                            files = files or submodule
+                        else:
+                            aliases[alias] = (files, name)
+                if not files and not spec.startswith('.'):
+                    external.add(spec.split('.')[0])
+            elif language == 'typescript':
+                files = self.typescript_module(spec, file)
+                for alias, name in names.items():
+                    aliases[alias] = (files, name)
+                if not files and not spec.startswith('.'):
+                    external.add('/'.join(spec.split('/')[:2 if spec.startswith('@') else 1]))
+            elif language == 'go':
+                files = self.go_package(spec, file)
+                for alias, name in names.items():
+                    if name == '*':
+                        star.extend(files)
+                    else:
+                        aliases[alias] = (files, None)
+                if not files:
+                    external.add(spec)
+            else:
+                files = []
+            targets.update(f for f in files if f != file)
+
+        return sorted(targets), sorted(external), aliases, star
+
+    def _in_files(self, files: Iterable[int], qualname: str) -> List[int]:
+        return [self.by_file[f][qualname] for f in files if qualname in self.by_file[f]]
+
+    def _unique(self, name: str, methods: bool) -> List[int]:
+        candidates = [d for d in self.by_name.get(name, []) if (self.definitions[d][2] == 'method') == methods]
+        return candidates if len(candidates) == 1 else []
+
+    def resolve_call(self, file: int, owner: str, name: str, aliases, star: List[int]) -> List[int]:
+        parts = name.split('.')
+        head, last = parts[0], parts[-1]
+        language = language_for(self.paths[file])
+        # Go functions can be called from any file of the same package
+        local = self.go_packages[posixpath.dirname(self.paths[file])] if language == 'go' else [file]
+
+        if len(parts) == 1:
+            found = self._in_files(local, name)
+            if not found and head in aliases:
+                files, imported = aliases[head]
+                found = self._in_files(files, imported or head) if imported not in (None, 'default') else []
+            if not found and star:
+                found = self._in_files(star, name)
+            if found or (language == 'python' and name in _PYTHON_BUILTINS) or name.lower() in _COMMON_METHODS:
+                return found
+            return self._unique(name, methods=False)
+
+        if head in ('self', 'cls', 'this') and len(parts) == 2:
+            owner_definition = self.by_file[file].get(owner)
+            if owner_definition is not None:
+                cls = owner if self.definitions[owner_definition][2] == 'class' else owner.rpartition('.')[0]
+                found = self._in_files([file], f"{cls}.{last}")
+                if found:
+                    return found
+
+        # module.func(), package.Type.method() or an imported class's Class.method()
+        for k in range(len(parts) - 1, 0, -1):
+            prefix = '.'.join(parts[:k])
+            if prefix in aliases:
+                files, imported = aliases[prefix]
+                rest = '.'.join(([imported] if imported not in (None, 'default') else []) + parts[k:])
+                found = self._in_files(files, rest)
+                if found:
+                    return found
+                break
+        found = self._in_files([file], name)
+        if found:
+            return found
+
+        # Unknown receiver: a method defined once in the package, or once in the repository.
+        # Go methods are mostly called on local variables, so a package's own method wins
+        # even with a common name; elsewhere common names are more likely library methods.
+        package_methods = [d for f in local for q, d in self.by_file[f].items() if q.endswith('.' + last)]
+        if len(package_methods) == 1 and (language == 'go' or last.lower() not in _COMMON_METHODS):
+            return package_methods
+        if last.lower() in _COMMON_METHODS or len(last) < 4:
+            return []
+        return self._unique(last, methods=True)
+
+
+def build_code_graph(
+    repo_files: List[Dict[str, Any]],
+    symbol_index: Dict[str, List[Dict[str, Any]]],
+    previous: Optional['CodeGraph'] = None
+) -> Dict[str, Any]:
+    """Import graph, definitions and a best-effort call graph of a repository, in compact form.
+
+    Definitions are [file, qualname, kind, start_line, end_line] rows (one 'module' row per
+    file stands for its top-level code); imports, external_imports and calls are pairs of
+    row indexes (external_imports pairs a file with a module name). Calls are resolved
+    through imports, self/this, same-file and same-package names, and names defined only
+    once in the repository; calls through variables and callbacks are missed. This is
+    CPU-bound: large repositories are parsed in the ingestion worker pool.
+
+    Each file's parsed imports and calls are kept as [sha256, facts] rows, so a re-upload
+    reuses them from the previous graph for unchanged files and only re-resolves the links.
+    """
+    paths = [f['path'] for f in repo_files]
+    file_index = {path: i for i, path in enumerate(paths)}
+
+    symbols = {}
+    for entries in symbol_index.values():
+        for symbol in entries:
+            if symbol['file'] in file_index:
+                symbols[(symbol['file'], symbol['qualname'])] = symbol
+    definitions = [
+        [file_index[s['file']], s['qualname'], s['kind'], s['start_line'], s['end_line']]
+        for s in sorted(symbols.values(), key=lambda s: (file_index[s['file']], s['start_line']))
+    ]
+    module_rows = {}
+    for i, file_info in enumerate(repo_files):
+        module_rows[i] = len(definitions)
+        definitions.append([i, module_name(file_info['path']), 'module', 1, file_info['content'].count('\n') + 1])
+
+    per_file = defaultdict(list)
+    for file, qualname, kind, start, end in definitions:
+        if kind != 'module':
+            per_file[file].append((qualname, start, end))
+    facts = [None] * len(repo_files)
+    if previous is not None:
+        old_facts = dict(zip(previous.files, previous.data.get('facts') or []))
+        for i, f in enumerate(repo_files):
+            old = old_facts.get(f['path'])
+            if old is not None and f.get('sha256') and old[0] == f['sha256']:
+                facts[i] = old[1]
+    parse = [i for i, fact in enumerate(facts) if fact is None]
+    work = [(repo_files[i]['path'], repo_files[i]['content'], per_file[i]) for i in parse]
+    if len(work) >= PARALLEL_MIN_FILES:
+        parsed = [fact for batch in map_batches(_facts_batch, [(batch,) for batch in split_batches(work)]) for fact in batch]
+    else:
+        parsed = _facts_batch(work)
+    for i, fact in zip(parse, parsed):
+        facts[i] = fact
+
+    resolver = _Resolver(paths, definitions)
+    for file_info in repo_files:
+        if PurePosixPath(file_info['path']).name == 'go.mod':
+            resolver.add_go_module(file_info['path'], file_info['content'])
+
+    imports, external_imports, calls = [], [], set()
+    for file, fact in enumerate(facts):
+        targets, external, aliases, star = resolver.resolve_imports(file, fact['imports'])
+        imports.extend([file, target] for target in targets)
+        external_imports.extend([file, name] for name in external)
+        for owner, names in fact['calls'].items():
+            caller = resolver.by_file[file].get(owner, module_rows[file]) if owner else module_rows[file]
+            for name in set(names):
+                for callee in resolver.resolve_call(file, owner, name, aliases, star):
+                    if callee != caller:
+                        calls.add((caller, callee))
+
+    logger.info(
+        f"Code graph: {len(definitions)} definitions, {len(imports)} imports, {len(calls)} calls "
+        f"({len(parse)} of {len(repo_files)} files parsed)"
+    )
+    return {
+        'files': paths,
+        'definitions': definitions,
+        'imports': imports,
+        'external_imports': external_imports,
+        'calls': sorted([list(call) for call in calls]),
+        'facts': [[f.get('sha256'), fact] for f, fact in zip(repo_files, facts)]
+    }
+
+
+class CodeGraph:
+    """Queryable view of a repository's code graph (the build_code_graph data)"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.files = data['files']
+        self.definitions = data['definitions']
+        self.callers = defaultdict(list)
+        self.callees = defaultdict(list)
+        for caller, callee in data['calls']:
+            self.callers[callee].append(caller)
+            self.callees[caller].append(callee)
+        self.imports = defaultdict(list)
+        self.importers = defaultdict(list)
+        for source, target in data['imports']:
+            self.imports[source].append(target)
+            self.importers[target].append(source)
+        self.external_imports = defaultdict(list)
+        for file, name in data['external_imports']:
+            self.external_imports[file].append(name)
+
+        self._by_key = defaultdict(list)
+        self._by_location = {}
+        for i, (file, qualname, kind, _, _) in enumerate(self.definitions):
+            self._by_location[(self.files[file], qualname)] = i
+            if kind == 'module':
+                continue
+            module = module_name(self.files[file])
+            for key in {qualname, qualname.rsplit('.', 1)[-1], f"{module}.{qualname}"}:
+                self._by_key[key].append(i)
+
+    def definition(self, index: int) -> Dict[str, Any]:
+        file, qualname, kind, start, end = self.definitions[index]
+        return {'file': self.files[file], 'qualname': qualname, 'kind': kind, 'start_line': start, 'end_line': end}
+
+    def find_definitions(self, name: str) -> List[int]:
+        """Definitions named name, Class.method or module.Class.method"""
+        return self._by_key.get(name.strip('`().'), [])
+
+    def find_files(self, name: str) -> List[int]:
+        """Files matching a path, a path suffix or a (dotted suffix of a) module name"""
+        name = name.strip('`').rstrip('.')
+        exact = [i for i, path in enumerate(self.files) if path == name]
+        if exact:
+            return exact
+        return [
+            i for i, path in enumerate(self.files)
+            if path.endswith('/' + name) or module_name(path) == name or module_name(path).endswith('.' + name)
+            or PurePosixPath(path).stem == name
+        ]
+
+    def definition_at(self, path: str, qualname: str) -> Optional[int]:
+        return self._by_location.get((path, qualname))
+
+    def neighbours(self, path: str, qualname: str) -> List[int]:
+        """Definitions a definition calls, then those calling it (module-level code excluded)"""
+        index = self.definition_at(path, qualname)
+        if index is None:
+            return []
+        related = self.callees[index] + self.callers[index]
+        return [d for d in dict.fromkeys(related) if self.definitions[d][2] != 'module']
+
+    def stats(self) -> Dict[str, Any]:
+        kinds = defaultdict(int)
+        for definition in self.definitions:
+            kinds[definition[2]] += 1
+        languages = defaultdict(int)
+        for path in self.files:
+            languages[language_for(path) or 'other'] += 1
+        return {
+            'files': len(self.files),
+            'languages': dict(languages),
+            'definitions': {kind: count for kind, count in kinds.items() if kind != 'module'},
+            'imports': len(self.data['imports']),
+            'external_modules': sorted({name for _, name in self.data['external_imports']}),
+            'calls': len(self.data['calls'])
+        }
+
+
+def get_code_graph(repo: Dict[str, Any]) -> CodeGraph:
+    """A repository's code graph, built on first use for repositories stored before code graphs.
+
+    This can parse the whole repository, so async callers should run it in a worker thread.
+    """
+    if repo.get('code_graph') is None:
+        symbols = repo.get('symbols') or chunk_files(repo['files'])[1]
+        repo['code_graph'] = CodeGraph(build_code_graph(repo['files'], symbols))
+    return repo['code_graph']
+
+
+_CALLERS_QUESTION = re.compile(
+    r"\b(?:(?:what|which|who)\s+(?:functions?\s+|methods?\s+|code\s+|files?\s+)?(?:calls?|uses?|invokes?)"
+    r"|(?:callers|usages)\s+of)\s+`?([\w.$]+?)`?(?:\(\))?\s*[?.!]*$"
+    r"|\bwhere\s+(?:is|are)\s+`?([\w.$]+?)`?(?:\(\))?\s+(?:called|used|invoked)\s*[?.!]*$",
+    re.I
+)
+_CALLEES_QUESTION = re.compile(r"\bwhat\s+(?:functions?\s+|methods?\s+)?does\s+`?([\w.$]+?)`?(?:\(\))?\s+call\s*[?.!]*$", re.I)
+_DEPENDENCIES_QUESTION = re.compile(
+    r"\bwhat\s+does\s+(?:the\s+)?(?:module\s+|file\s+|package\s+)?`?([\w./$-]+?)`?\s+(?:depend\s+on|import)\s*[?.!]*$", re.I
+)
+_DEPENDENTS_QUESTION = re.compile(
+    r"\b(?:what|which|who)\s+(?:modules?\s+|files?\s+|packages?\s+)?(?:depends?\s+on|imports?)\s+(?:the\s+)?"
+    r"(?:module\s+|file\s+|package\s+)?`?([\w./$-]+?)`?\s*[?.!]*$",
+    re.I
+)
+
+
+def _listing(graph: CodeGraph, indexes: List[int], describe) -> str:
+    lines = [f"- {describe(i)}" for i in indexes[:MAX_LISTED]]
+    if len(indexes) > MAX_LISTED:
+        lines.append(f"- ... and {len(indexes) - MAX_LISTED} more")
+    return '\n'.join(lines)
+
+
+def _describe_definition(graph: CodeGraph, index: int) -> str:
+    d = graph.definition(index)
+    if d['kind'] == 'module':
+        return f"module-level code of `{d['file']}`"
+    return f"`{d['qualname']}` ({d['kind']} in {d['file']}, line {d['start_line']})"
+
+
+def answer_structural_question(graph: CodeGraph, question: str) -> Optional[Tuple[str, List[str]]]:
+    """Answer "what calls X", "what does X call", "what does module Y depend on" and "what
+    imports Y" from the code graph. Returns the answer with the files it mentions, or None
+    when the question isn't one of these or names nothing in the graph.
+    """
+    question = question.strip()
+
+    for pattern, direction in ((_CALLEES_QUESTION, 'callees'), (_CALLERS_QUESTION, 'callers')):
+        match = pattern.search(question)
+        if not match:
+            continue
+        targets = graph.find_definitions(next(group for group in match.groups() if group))
+        if not targets:
+            return None
+        sections, files = [], set()
+        for target in targets[:MAX_LISTED]:
+            related = graph.callers[target] if direction == 'callers' else graph.callees[target]
+            files.add(graph.definition(target)['file'])
+            files.update(graph.definition(i)['file'] for i in related)
+            if not related:
+                verb = "No calls to" if direction == 'callers' else "No calls to repository code from"
+                sections.append(f"{verb} {_describe_definition(graph, target)} were found.")
+                continue
+            heading = "is called by" if direction == 'callers' else "calls"
+            sections.append(
+                f"{_describe_definition(graph, target)} {heading}:\n"
+                + _listing(graph, related, lambda i: _describe_definition(graph, i))
+            )
+        note = "\n\nThe call graph is best-effort: calls through variables, callbacks or dynamic dispatch are not tracked."
+        return '\n\n'.join(sections) + note, sorted(files)
+
+    for pattern, direction in ((_DEPENDENCIES_QUESTION, 'imports'), (_DEPENDENTS_QUESTION, 'importers')):
+        match = pattern.search(question)
+        if not match:
+            continue
+        targets = graph.find_files(match.group(1))
+        if not targets:
+            return None
+        sections, files = [], set()
+        for target in targets[:MAX_LISTED]:
+            path = graph.files[target]
+            files.add(path)
+            if direction == 'imports':
+                internal = graph.imports[target]
+                external = graph.external_imports[target]
+                files.update(graph.files[i] for i in internal)
+                parts = [f"`{path}` imports {len(internal)} repository files and {len(external)} external modules."]
+                if internal:
+                    parts.append("Repository files:\n" + _listing(graph, internal, lambda i: f"`{graph.files[i]}`"))
+                if external:
+                    parts.append("External modules: " + ', '.join(f"`{name}`" for name in external))
+                sections.append('\n'.join(parts))
+            else:
+                importers = graph.importers[target]
+                files.update(graph.files[i] for i in importers)
+                if importers:
+                    sections.append(f"`{path}` is imported by:\n" + _listing(graph, importers, lambda i: f"`{graph.files[i]}`"))
+                else:
+                    sections.append(f"No repository file imports `{path}`.")
+        return '\n\n'.join(sections), sorted(files)
+
+    return None
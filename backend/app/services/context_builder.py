@@ -0,0 +1,143 @@
+import ast
+import os
+import re
+from typing import List, Dict, Any, Optional
+import logging
+
+from app.services.chunker import LANGUAGES, language_for
+from app.services.utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Default prompt budget for repository context, in estimated tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 32_000))
+
+def _signature_lines(lines: List[str], language: str) -> str:
+    signature = LANGUAGES[language]['signature'] if language in LANGUAGES else None
+    if signature is None:
+        return ''
+    return '\n'.join(line.rstrip() for line in lines if signature.match(line))
+
+
+def outline_source(content: str, language: str = 'python') -> str:
+    """Module docstring plus class and function signatures, keeping their indentation.
+
+    Other languages keep the lines that match their registered signature pattern.
+    """
+    lines = content.split('\n')
+    if language != 'python':
+        return _signature_lines(lines, language)
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        # Not valid Python: keep whatever looks like a definition line
+        return _signature_lines(lines, language)
+
+    parts = []
+    docstring = ast.get_docstring(tree)
+    if docstring:
+        parts.append(f'"""{docstring}"""')
+
+    def visit(nodes):
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                # The signature runs from the def/class line up to the first body statement
+                end = max(node.body[0].lineno - 1, node.lineno)
+                parts.append('\n'.join(lines[node.lineno - 1:end]).rstrip())
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body)
+
+    visit(tree.body)
+    return '\n'.join(parts)
+
+
+def get_outline(file_info: Dict[str, Any]) -> str:
+    """Outline of a repository file, computed once and kept on the file record"""
+    if 'outline' not in file_info:
+        file_info['outline'] = outline_source(file_info['content'], language_for(file_info['path']) or '')
+    return file_info['outline']
+
+
+class ContextBuilder:
+    """Assembles prompt context within a token budget and joins it once at the end"""
+
+    def __init__(self, header: str = "", budget: Optional[int] = None):
+        self.budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+        self.parts = [header] if header else []
+        self.tokens = estimate_tokens(header) if header else 0
+
+    def fits(self, tokens: int) -> bool:
+        return self.tokens + tokens <= self.budget
+
+    def add(self, text: str) -> bool:
+        """Append text if it fits in the remaining budget"""
+        tokens = estimate_tokens(text)
+        if not self.fits(tokens):
+            return False
+        self.parts.append(text)
+        self.tokens += tokens
+        return True
+
+    def build(self) -> str:
+        return "".join(self.parts)
+
+    def add_files(self, files: List[Dict[str, Any]], priority: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Fill the budget from whole files in priority order.
+
+        Every file first gets an outline (module docstring and signatures); then files are
+        upgraded to their full content, highest priority first, while the budget allows.
+        priority lists file paths, most relevant first (default: smallest files first).
+        Returns which files were included in full, as outlines only, or dropped.
+        """
+        if priority is None:
+            priority = [f['path'] for f in sorted(files, key=lambda f: len(f['content']))]
+
+        by_path = {f['path']: f for f in files}
+        full_sections = {path: f"File: {path}\nContent:\n{f['content']}\n\n" for path, f in by_path.items()}
+        outline_sections = {}
+        remaining = self.budget - self.tokens
+
+        # Outlines first, so every file is at least represented if the budget allows
+        for path in priority:
+            section = f"File: {path}\nOutline:\n{get_outline(by_path[path])}\n\n"
+            tokens = estimate_tokens(section)
+            if tokens <= remaining:
+                outline_sections[path] = (section, tokens)
+                remaining -= tokens
+
+        # Then upgrade to full bodies, most relevant first
+        full = set()
+        for path in priority:
+            tokens = estimate_tokens(full_sections[path])
+            saved = outline_sections.get(path, ("", 0))[1]
+            if tokens - saved <= remaining:
+                full.add(path)
+                remaining -= tokens - saved
+
+        included, outlined, dropped = [], [], []
+        for file_info in files:
+            path = file_info['path']
+            if path in full:
+                section = full_sections[path]
+                included.append(path)
+            elif path in outline_sections:
+                section = outline_sections[path][0]
+                outlined.append(path)
+            else:
+                dropped.append(path)
+                continue
+            self.parts.append(section)
+            self.tokens += estimate_tokens(section)
+
+        return {'included': included, 'outlined': outlined, 'dropped': dropped}
+
+
+def rank_files_by_query(files: List[Dict[str, Any]], query: str) -> List[str]:
+    """Order file paths by how many of the query's words appear in each file"""
+    terms = {t for t in re.findall(r"[A-Za-z_][A-Za-z0-9_]{2,}", query.lower())}
+
+    def score(file_info):
+        text = f"{file_info['path']}\n{file_info['content']}".lower()
+        return sum(1 for term in terms if term in text)
+
+    return [f['path'] for f in sorted(files, key=score, reverse=True)]
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import os
+from collections import defaultdict
+from pathlib import PurePosixPath
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+from app.services.context_builder import ContextBuilder, get_outline
+from app.services.scheduler import BACKGROUND
+from app.services.sqlite_lru import SQLiteLRU
+
+logger = logging.getLogger(__name__)
+
+FILE_SUMMARY_QUESTION = (
+    "Summarize this file for a developer who has not seen it: its purpose, its main classes "
+    "and functions, and how it is used. Be concise (under 150 words)."
+)
+PACKAGE_SUMMARY_QUESTION = (
+    "These are summaries of the files in one package of the repository. Summarize the package: "
+    "its purpose and how its files fit together. Be concise (under 200 words)."
+)
+
+
+class SummaryCache(SQLiteLRU):
+    """On-disk cache of generated summaries keyed by (model, kind, sha256 of the summarized input)"""
+
+    def __init__(self, path: str, max_entries: int = 50_000):
+        super().__init__(path, "summaries", ("model", "kind", "input_hash"), "summary", "TEXT", max_entries)
+
+    @staticmethod
+    def input_hash(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, model: str, kind: str, input_hash: str) -> Optional[str]:
+        return self.lookup((model, kind), [input_hash]).get(input_hash)
+
+    def put(self, model: str, kind: str, input_hash: str, summary: str):
+        self.store((model, kind), {input_hash: summary})
+
+
+class DocumentationPipeline:
+    """Map-reduce documentation for repositories too large for a single prompt.
+
+    Files are summarized concurrently (map), file summaries are combined into one summary
+    per package directory (reduce), and the package summaries become the context for the
+    final README. Summaries are cached by content hash, so regenerating docs after a small
+    change only re-summarizes the files, and packages, that changed.
+    """
+
+    def __init__(self, ai_service, cache: Optional[SummaryCache] = None, max_workers: Optional[int] = None):
+        self.ai_service = ai_service
+
+        # Set SUMMARY_CACHE_PATH to an empty string to disable the on-disk cache
+        cache_path = os.getenv("SUMMARY_CACHE_PATH", ".cache/summaries.sqlite3")
+        if cache is None and cache_path:
+            cache = SummaryCache(cache_path, int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 50_000)))
+        self.cache = cache
+
+        self.max_workers = max_workers or int(os.getenv("DOCS_MAX_WORKERS", 4))
+
+    async def _summarize(self, kind: str, input_hash: str, context: str, question: str, fallback: str, key: str = "") -> str:
+        """Summarize context with the model, reusing a cached summary of identical input.
+
+        Summaries are background requests to the upstream scheduler, queued under key.
+        """
+        model = self.ai_service.model
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, model, kind, input_hash)
+            if cached is not None:
+                return cached
+
+        summary = await self.ai_service.complete(context, question, BACKGROUND, key)
+        if summary is None:
+            # Upstream unavailable: use the fallback text for this run but don't cache it
+            return fallback
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, model, kind, input_hash, summary)
+        return summary
+
+    async def summarize_file(self, file_info: Dict[str, Any], key: str = "") -> str:
+        builder = ContextBuilder()
+        builder.add_files([file_info])
+        return await self._summarize(
+            "file",
+            SummaryCache.input_hash(file_info['path'], file_info['content']),
+            builder.build(),
+            FILE_SUMMARY_QUESTION,
+            fallback=get_outline(file_info),
+            key=key
+        )
+
+    async def summarize_package(self, package: str, file_summaries: List[Tuple[str, str]], key: str = "") -> str:
+        builder = ContextBuilder(f"Package: {package}\n\n")
+        for path, summary in file_summaries:
+            builder.add(f"File: {path}\nSummary:\n{summary}\n\n")
+        context = builder.build()
+        return await self._summarize(
+            "package",
+            SummaryCache.input_hash(package, context),
+            context,
+            PACKAGE_SUMMARY_QUESTION,
+            fallback=context,
+            key=key
+        )
+
+    async def build_context(self, repo: Dict[str, Any]) -> Tuple[ContextBuilder, List[str], List[str]]:
+        """Run the map and reduce stages.
+
+        Returns the final documentation context with the files it covers and any dropped
+        because their package summaries didn't fit the budget.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        hits_before = self.cache.hits if self.cache else 0
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        files = repo['files']
+        summaries = await asyncio.gather(*(bounded(self.summarize_file(f, repo['id'])) for f in files))
+
+        packages = defaultdict(list)
+        for file_info, summary in zip(files, summaries):
+            package = str(PurePosixPath(file_info['path']).parent)
+            packages[package].append((file_info['path'], summary))
+
+        names = sorted(packages)
+        package_summaries = await asyncio.gather(
+            *(bounded(self.summarize_package(name, packages[name], repo['id'])) for name in names)
+        )
+
+        builder = ContextBuilder(
+            f"Repository: {repo['name']}\n"
+            f"Total files: {repo['file_count']}\n"
+            "Package summaries, each built from summaries of the package's files:\n\n"
+        )
+        included, dropped = [], []
+        for name, summary in zip(names, package_summaries):
+            paths = [path for path, _ in packages[name]]
+            if builder.add(f"Package: {name}\nFiles: {', '.join(paths)}\nSummary:\n{summary}\n\n"):
+                included.extend(paths)
+            else:
+                dropped.extend(paths)
+
+        if self.cache:
+            reused = self.cache.hits - hits_before
+            logger.info(
+                f"Documentation pipeline for {repo['id']}: {len(files)} files in {len(names)} packages, "
+                f"{reused} of {len(files) + len(names)} summaries reused from cache"
+            )
+
+        return builder, included, dropped
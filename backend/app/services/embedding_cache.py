@@ -0,0 +1,24 @@
+import hashlib
+from typing import Dict, Iterable
+import numpy as np
+
+from app.services.sqlite_lru import SQLiteLRU
+
+
+class EmbeddingCache(SQLiteLRU):
+    """On-disk embedding cache keyed by (model, sha256 of chunk content) with LRU eviction"""
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        super().__init__(path, "embeddings", ("model", "content_hash"), "vector", "BLOB", max_entries)
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Look up cached vectors, refreshing their LRU timestamp"""
+        return {h: np.frombuffer(blob, dtype=np.float32) for h, blob in self.lookup((model,), hashes).items()}
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        """Store vectors and evict the least recently used entries beyond max_entries"""
+        self.store((model,), {h: np.asarray(v, dtype=np.float32).tobytes() for h, v in vectors.items()})
@@ -1,105 +1,351 @@
+import asyncio
 import os
-from typing import List, Dict, Any
+import random
+import threading
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
 import logging
-from openai import AsyncOpenAI
+import numpy as np
+
+from app.services.chunker import chunk_files
+from app.services.embedding_cache import EmbeddingCache
+from app.services.metrics import CHUNKS, EMBEDDING_TEXTS, EMBEDDING_TOKENS, stage_timer
+from app.services.retrieval import build_lexical_index
+from app.services.scheduler import BACKGROUND, INTERACTIVE, upstream_scheduler
+from app.services.utils import estimate_tokens
+from app.services.vector_index import VectorIndex
+from app.services.worker_pool import PARALLEL_MIN_FILES, map_batches, split_batches
 
 logger = logging.getLogger(__name__)
 
 class EmbeddingService:
     """Service for handling code embeddings and similarity search"""
     
-    def __init__(self, model: str = "openai/text-embedding-3-small"):
+    def __init__(self, model: str = "openai/text-embedding-3-small", cache: Optional[EmbeddingCache] = None):
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.model = model
 
+        # Set EMBEDDING_CACHE_PATH to an empty string to disable the on-disk cache
+        cache_path = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+        if cache is None and cache_path:
+            cache = EmbeddingCache(cache_path, int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 100_000)))
+        self.cache = cache
+
+        # Request batching: chunk texts are grouped into batches under a token and input budget.
+        # How many batches are in flight is left to the upstream scheduler, so a query
+        # embedding never queues behind an upload's batches outside its priority lane
+        self.max_batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", 50_000))
+        self.max_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+        self.max_input_tokens = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", 8000))
+        self.max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", 3))
+
+        self._client = None
+        self._client_lock = threading.Lock()
         if not self.api_key:
             logger.warning("OPENROUTER_API_KEY not found. Embedding features will not work.")
-            self.client = None
-        else:
-            self.client = AsyncOpenAI(
+
+    @property
+    def client(self):
+        """Embeddings API client, created on first use (None without an API key).
+
+        The openai package takes longer to import than the rest of the app, so it is only
+        imported here, off the startup path.
+        """
+        if self._client is not None or not self.api_key:
+            return self._client
+        # Locked, as warm-up and a first request may both get here
+        with self._client_lock:
+            if self._client is not None:
+                return self._client
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
                 default_headers={
                     "HTTP-Referer": "http://localhost:10000",
                     "X-Title": "CodeMind Lite"
-                }
+                },
+                # Retries are handled per batch in _embed_batch
+                max_retries=0
             )
+        return self._client
 
-    async def chunk_repository(self, repo_files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Split repository files into logical code chunks for embedding."""
-        chunks = []
-        
-        for file_info in repo_files:
-            lines = file_info['content'].split('\n')
-            
-            current_chunk_lines = []
-            chunk_start_line = 0
-            
-            for i, line in enumerate(lines):
-                # A new chunk starts with a top-level (not indented) function or class definition
-                is_new_block_start = (line.startswith('def ') or line.startswith('class '))
-                
-                if is_new_block_start and current_chunk_lines:
-                    # Finalize the previous chunk if it's not just whitespace
-                    content = '\n'.join(current_chunk_lines).strip()
-                    if content:
-                        chunks.append({
-                            'file': file_info['path'],
-                            'content': content,
-                            'start_line': chunk_start_line,
-                            'end_line': i - 1
-                        })
-                    
-                    # Start the new chunk
-                    current_chunk_lines = [line]
-                    chunk_start_line = i
-                else:
-                    current_chunk_lines.append(line)
-
-            # Add the last remaining chunk in the file
-            if current_chunk_lines:
-                content = '\n'.join(current_chunk_lines).strip()
-                if content:
-                    chunks.append({
-                        'file': file_info['path'],
-                        'content': content,
-                        'start_line': chunk_start_line,
-                        'end_line': len(lines) - 1
-                    })
-        
-        # Filter out very small chunks that are unlikely to be useful
-        return [c for c in chunks if len(c['content']) > 20]
+    async def aclose(self):
+        """Close the embeddings API client"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def chunk_repository(self, repo_files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Split repository files into logical code chunks for embedding.
+
+        This is CPU-bound, so async callers should run it in a worker thread.
+        """
+        chunks, _ = chunk_files(repo_files)
+        return chunks
     
-    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts"""
+    async def embed_texts(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int], None]] = None,
+        priority: str = INTERACTIVE,
+        key: str = ""
+    ) -> np.ndarray:
+        """Generate embeddings for a list of texts as a float32 matrix, one row per text.
+
+        Vectors already in the cache are reused, so only new or changed texts are sent to the API.
+        on_progress is called with the number of texts embedded as each batch completes.
+        Requests go through the upstream scheduler in the priority lane, queued under key.
+        """
         if not self.client:
             raise ValueError("Embedding service is not configured. OPENROUTER_API_KEY is missing.")
-        
-        response = await self.client.embeddings.create(
-            model=self.model,
-            input=texts
-        )
-        return [item.embedding for item in response.data]
-
-    async def find_relevant_chunks(self, chunks: List[Dict[str, Any]], query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Find most relevant code chunks for a query using embeddings"""
+
+        if self.cache is None:
+            EMBEDDING_TEXTS.inc(len(texts), source="api")
+            return await self._request_embeddings(texts, on_progress, priority, key)
+
+        hashes = [EmbeddingCache.content_hash(text) for text in texts]
+        with stage_timer("embedding_cache"):
+            vectors = await asyncio.to_thread(self.cache.get_many, self.model, hashes)
+
+        # Embed each missing text once, even if it appears several times
+        missing = {h: text for h, text in zip(hashes, texts) if h not in vectors}
+        EMBEDDING_TEXTS.inc(len(texts) - len(missing), source="cache")
+        EMBEDDING_TEXTS.inc(len(missing), source="api")
+        if on_progress:
+            on_progress(len(texts) - len(missing))
+        if missing:
+            new_vectors = await self._request_embeddings(list(missing.values()), on_progress, priority, key)
+            fresh = dict(zip(missing.keys(), new_vectors))
+            await asyncio.to_thread(self.cache.put_many, self.model, fresh)
+            vectors.update(fresh)
+
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} reused, {len(missing)} requested")
+        return np.stack([vectors[h] for h in hashes])
+
+    async def _request_embeddings(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int], None]] = None,
+        priority: str = INTERACTIVE,
+        key: str = ""
+    ) -> np.ndarray:
+        """Embed texts in token-budgeted batches sent concurrently, keeping input order"""
+        batches = self._make_batches([self._truncate(text) for text in texts])
+        results = await asyncio.gather(*(self._embed_batch(batch, on_progress, priority, key) for batch in batches))
+        if len(batches) > 1:
+            logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return np.concatenate(results)
+
+    def _truncate(self, text: str) -> str:
+        """Trim a single input to the model's per-input token limit"""
+        max_chars = self.max_input_tokens * 4
+        if len(text) > max_chars:
+            return text[:max_chars]
+        return text
+
+    def _make_batches(self, texts: List[str]) -> List[List[str]]:
+        batches = []
+        current = []
+        current_tokens = 0
+
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _embed_batch(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int], None]] = None,
+        priority: str = INTERACTIVE,
+        key: str = ""
+    ) -> np.ndarray:
+        """Embed one batch, retrying transient failures with exponential backoff.
+
+        A 429 pauses the upstream scheduler for as long as the API asks, and the retry
+        waits in its queue rather than backing off here.
+        """
+        import openai
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with upstream_scheduler.slot(priority, key):
+                    with stage_timer("embedding_request"):
+                        raw = await self.client.embeddings.with_raw_response.create(
+                            model=self.model,
+                            input=texts
+                        )
+                upstream_scheduler.observe(raw.status_code, raw.headers)
+                response = raw.parse()
+                EMBEDDING_TOKENS.inc(sum(estimate_tokens(text) for text in texts))
+                data = sorted(response.data, key=lambda item: item.index)
+                if on_progress:
+                    on_progress(len(texts))
+                return np.asarray([item.embedding for item in data], dtype=np.float32)
+            except openai.RateLimitError as e:
+                if not upstream_scheduler.observe(e.status_code, e.response.headers) or attempt == self.max_retries:
+                    raise
+                logger.warning(f"Embedding batch of {len(texts)} was rate limited, retrying")
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 30) + random.uniform(0, 0.5)
+                logger.warning(f"Embedding batch of {len(texts)} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def build_index(
+        self,
+        repo_files: List[Dict[str, Any]],
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        previous: Optional[Dict[str, Any]] = None,
+        priority: str = BACKGROUND,
+        key: str = ""
+    ) -> Dict[str, Any]:
+        """Chunk and embed a repository once so chat requests can reuse the vectors.
+
+        Returns the chunks, the symbol index, the BM25 LexicalIndex and a VectorIndex with one
+        row per chunk (None when embeddings are unavailable). on_progress is called with
+        (chunks embedded, total chunks).
+
+        previous is the stored version of the same repository when it is re-uploaded: files
+        whose sha256 hasn't changed keep their chunks, symbols and vectors, and only new or
+        changed files are chunked and embedded. Embedding requests are background requests
+        to the upstream scheduler unless priority says otherwise, queued under key.
+        """
+        unchanged = _unchanged_paths(repo_files, previous)
+        changed_files = [f for f in repo_files if f['path'] not in unchanged]
+        if previous is not None:
+            removed = len({f['path'] for f in previous['files']} - {f['path'] for f in repo_files})
+            logger.info(
+                f"Re-upload of {previous['id']}: {len(unchanged)} files unchanged, "
+                f"{len(changed_files)} new or changed, {removed} removed"
+            )
+
+        with stage_timer("chunk"):
+            new_chunks, new_symbols = await asyncio.to_thread(_chunk_in_workers, changed_files)
+        CHUNKS.inc(len(new_chunks))
+
+        # Rows of the previous chunks (and vectors) that belong to unchanged files
+        reused_rows = [i for i, c in enumerate(previous['chunks']) if c['file'] in unchanged] if unchanged else []
+        chunks = [previous['chunks'][i] for i in reused_rows] + new_chunks
+        symbols = _merge_symbols(previous['symbols'], unchanged, new_symbols) if unchanged else new_symbols
+
+        # BM25 statistics span the whole repository, so the index is always rebuilt
+        with stage_timer("lexical_index"):
+            lexical_index = await asyncio.to_thread(build_lexical_index, chunks)
+        if not self.client or not chunks:
+            # Nothing is embedded, but the job still reports how many chunks the repository has
+            if on_progress:
+                on_progress(0, len(chunks))
+            return {'chunks': chunks, 'symbols': symbols, 'lexical_index': lexical_index, 'vector_index': None}
+
+        # Without previous vectors every chunk is embedded (the embedding cache still skips known content)
+        previous_index = previous.get('vector_index') if unchanged else None
+        if previous_index is None:
+            reused_rows, to_embed = [], chunks
+        else:
+            to_embed = new_chunks
+
+        embedded = len(reused_rows)
+        def on_embedded(count: int):
+            nonlocal embedded
+            embedded += count
+            if on_progress:
+                on_progress(embedded, len(chunks))
+
+        on_embedded(0)
+        try:
+            with stage_timer("embed_chunks"):
+                embeddings = await self.embed_texts([c["content"] for c in to_embed], on_embedded, priority, key) if to_embed else None
+        except Exception as e:
+            # Keep the chunks and symbols, the vectors can be built later
+            logger.warning(f"Could not embed repository chunks: {e}")
+            return {'chunks': chunks, 'symbols': symbols, 'lexical_index': lexical_index, 'vector_index': None}
+
+        if reused_rows:
+            parts = [previous_index.rows(reused_rows)]
+            if embeddings is not None:
+                parts.append(embeddings)
+            embeddings = np.concatenate(parts)
+
+        logger.info(f"Embedded {len(to_embed)} chunks for repository index, reused vectors for {len(reused_rows)}")
+        return {
+            'chunks': chunks,
+            'symbols': symbols,
+            'lexical_index': lexical_index,
+            'vector_index': VectorIndex(embeddings)
+        }
+
+    async def find_relevant_chunks(
+        self,
+        chunks: List[Dict[str, Any]],
+        query: str,
+        top_k: int = 3,
+        vector_index: Optional[VectorIndex] = None
+    ) -> List[Dict[str, Any]]:
+        """Find most relevant code chunks for a query using embeddings.
+
+        When the precomputed vector_index from build_index is passed only the
+        query is embedded, otherwise every chunk is embedded on the fly.
+        Returns copies of the matching chunks with a relevance_score added.
+        """
         if not self.client or not chunks:
             return []
         
-        # Embed query + all chunks
         query_embedding = (await self.embed_texts([query]))[0]
-        chunk_embeddings = await self.embed_texts([c["content"] for c in chunks])
-
-        # Compute cosine similarity
-        import numpy as np
-        def cosine_sim(a, b):
-            if np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
-                return 0.0
-            return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-        
-        for chunk, emb in zip(chunks, chunk_embeddings):
-            chunk["relevance_score"] = cosine_sim(query_embedding, emb)
-        
-        # Sort and return top_k
-        chunks.sort(key=lambda x: x["relevance_score"], reverse=True)
-        return chunks[:top_k]
+        if vector_index is None:
+            vector_index = VectorIndex(await self.embed_texts([c["content"] for c in chunks]))
+
+        return [
+            {**chunks[i], "relevance_score": score}
+            for i, score in vector_index.search(query_embedding, top_k)
+        ]
+
+def _unchanged_paths(repo_files: List[Dict[str, Any]], previous: Optional[Dict[str, Any]]) -> Set[str]:
+    """Paths of files whose content hash matches the previous version of the repository"""
+    if not previous:
+        return set()
+    old_hashes = {f['path']: f.get('sha256') for f in previous['files']}
+    return {
+        f['path'] for f in repo_files
+        if f.get('sha256') and old_hashes.get(f['path']) == f['sha256']
+    }
+
+def _chunk_in_workers(repo_files: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """chunk_files, spread over the ingestion worker pool for large repositories (blocking)"""
+    if len(repo_files) < PARALLEL_MIN_FILES:
+        return chunk_files(repo_files)
+
+    # Send only what chunking needs, not cached outlines and hashes
+    batches = [([{'path': f['path'], 'content': f['content']} for f in batch],) for batch in split_batches(repo_files)]
+    chunks = []
+    symbol_index = {}
+    for batch_chunks, batch_symbols in map_batches(chunk_files, batches):
+        chunks.extend(batch_chunks)
+        for key, symbols in batch_symbols.items():
+            symbol_index.setdefault(key, []).extend(symbols)
+    return chunks, symbol_index
+
+
+def _merge_symbols(
+    old_index: Dict[str, List[Dict[str, Any]]],
+    keep_files: Set[str],
+    new_index: Dict[str, List[Dict[str, Any]]]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Symbol index with the previous entries of keep_files plus the newly chunked files"""
+    merged = {}
+    for key, symbols in old_index.items():
+        kept = [s for s in symbols if s['file'] in keep_files]
+        if kept:
+            merged[key] = kept
+    for key, symbols in new_index.items():
+        merged.setdefault(key, []).extend(symbols)
+    return merged
@@ -0,0 +1,198 @@
+import codecs
+import hashlib
+import os
+import zipfile
+from pathlib import PurePosixPath
+from typing import List, Dict, Any, BinaryIO, Callable, Optional, Tuple, Union
+import logging
+
+from app.services.chunker import language_for
+from app.services.metrics import EXTRACTED_BYTES, EXTRACTED_FILES, SKIPPED_FILES, stage_timer
+from app.services.worker_pool import PARALLEL_MIN_FILES, map_batches, split_batches
+
+logger = logging.getLogger(__name__)
+
+# Larger files are skipped: generated code, data dumps and bundles crowd out the real source
+MAX_SOURCE_FILE_BYTES = int(os.getenv("MAX_SOURCE_FILE_KB", 1024)) * 1024
+# Files with a NUL byte in their first bytes are binary
+BINARY_SNIFF_BYTES = 8192
+# Lines this long on average mean minified JavaScript
+MINIFIED_LINE_LENGTH = 500
+
+# Directories that don't contain source code
+EXCLUDED_DIRS = {'__pycache__', 'node_modules', 'venv', 'env', 'vendor', 'dist'}
+# Generated files with the extension of a registered language
+EXCLUDED_FILES = {'package-lock.json', 'npm-shrinkwrap.json', 'pnpm-lock.yaml', 'composer.lock'}
+
+# Byte order marks, longest first (the UTF-32 LE mark starts with the UTF-16 LE one)
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def _posix_path(name: str) -> str:
+    """A ZIP member's path with '/' separators (archives made on Windows may use '\\')"""
+    return name.replace('\\', '/')
+
+
+def is_excluded_path(member_path: str) -> bool:
+    """Check whether a ZIP member lives under a hidden or excluded directory"""
+    directories = PurePosixPath(_posix_path(member_path)).parts[:-1]
+    return any(d.startswith('.') or d in EXCLUDED_DIRS for d in directories)
+
+
+def decode_source(data: bytes) -> Optional[str]:
+    """Decode file bytes, or return None for binary data.
+
+    The encoding is picked in one step: a byte order mark if there is one, otherwise
+    UTF-8, falling back to cp1252 (with replacement characters) for legacy 8-bit files.
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding, errors='replace')
+
+    if b'\x00' in data[:BINARY_SNIFF_BYTES]:
+        return None
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', errors='replace')
+
+
+def _extract_script(path: str, data: bytes) -> Optional[str]:
+    """TypeScript and JavaScript, without minified bundles"""
+    content = decode_source(data)
+    if content is None:
+        return None
+    if '.min.' in PurePosixPath(path).name or len(content) / (content.count('\n') + 1) > MINIFIED_LINE_LENGTH:
+        return None
+    return content
+
+
+def _extract_text(path: str, data: bytes) -> Optional[str]:
+    return decode_source(data)
+
+
+# Per-language extractors: turn a member's bytes into the text to index, or None to skip it.
+# Languages without one use _extract_text; a language is ingested once the chunker registers it.
+EXTRACTORS: Dict[str, Callable[[str, bytes], Optional[str]]] = {}
+
+
+def register_extractor(language: str, extractor: Callable[[str, bytes], Optional[str]]):
+    """Use extractor(path, data) -> text or None to read the files of a registered language"""
+    EXTRACTORS[language] = extractor
+
+
+register_extractor('typescript', _extract_script)
+
+
+def is_source_member(info: zipfile.ZipInfo) -> bool:
+    """Whether a ZIP member is a file of a registered language outside excluded directories"""
+    if info.is_dir() or is_excluded_path(info.filename):
+        return False
+    if PurePosixPath(_posix_path(info.filename)).name.lower() in EXCLUDED_FILES:
+        return False
+    return language_for(_posix_path(info.filename)) is not None
+
+
+def _read_members(zip_ref: zipfile.ZipFile, members: List[zipfile.ZipInfo], on_file: Optional[Callable[[], None]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int], int]:
+    """Read and decode members of an open archive.
+
+    Returns the file records, the number of skipped files by reason, and the bytes read.
+    """
+    files = []
+    skipped: Dict[str, int] = {}
+    bytes_read = 0
+
+    for info in members:
+        reason = None
+        if info.file_size > MAX_SOURCE_FILE_BYTES:
+            # Checked against the central directory, without reading the file
+            reason = 'too_large'
+        else:
+            try:
+                data = zip_ref.read(info)
+                bytes_read += len(data)
+                path = _posix_path(info.filename)
+                language = language_for(path)
+                content = EXTRACTORS.get(language, _extract_text)(path, data)
+                if content is None:
+                    reason = 'filtered'
+                else:
+                    files.append({
+                        'path': path,
+                        'content': content,
+                        'size': len(content),
+                        # Used to tell which files changed when the repository is re-uploaded
+                        'sha256': hashlib.sha256(data).hexdigest()
+                    })
+            except Exception as e:
+                logger.warning(f"Could not read file {info.filename}: {e}")
+                reason = 'unreadable'
+
+        if reason is not None:
+            skipped[reason] = skipped.get(reason, 0) + 1
+        if on_file:
+            on_file()
+
+    return files, skipped, bytes_read
+
+
+def _read_members_from_path(zip_path: str, names: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, int], int]:
+    """Worker process entry point: open the archive by path and read some of its members"""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        return _read_members(zip_ref, [zip_ref.getinfo(name) for name in names])
+
+
+def extract_source_files(
+    source: Union[str, BinaryIO],
+    on_file: Optional[Callable[[], None]] = None
+) -> List[Dict[str, Any]]:
+    """Read the source files of every registered language from an uploaded ZIP (a path or seekable file object).
+
+    Members outside excluded directories are read straight from the archive's central
+    directory; nothing is extracted to disk. Oversized, binary and filtered files (e.g.
+    minified JavaScript) are skipped. Large archives given by path are read by the
+    ingestion worker pool, each worker opening the archive itself. This does blocking
+    I/O, so run it off the event loop. on_file is called after each source file is scanned.
+    """
+
+    try:
+        with stage_timer("extract"), zipfile.ZipFile(source, 'r') as zip_ref:
+            members = [info for info in zip_ref.infolist() if is_source_member(info)]
+
+            if isinstance(source, str) and len(members) >= PARALLEL_MIN_FILES:
+                def on_batch(result):
+                    if on_file:
+                        for _ in range(len(result[0]) + sum(result[1].values())):
+                            on_file()
+
+                batches = [(source, [info.filename for info in batch]) for batch in split_batches(members)]
+                results = map_batches(_read_members_from_path, batches, on_batch)
+            else:
+                results = [_read_members(zip_ref, members, on_file)]
+
+        source_files = []
+        skipped_total: Dict[str, int] = {}
+        for files, skipped, bytes_read in results:
+            source_files.extend(files)
+            EXTRACTED_FILES.inc(len(files))
+            EXTRACTED_BYTES.inc(bytes_read)
+            for reason, count in skipped.items():
+                skipped_total[reason] = skipped_total.get(reason, 0) + count
+        for reason, count in skipped_total.items():
+            SKIPPED_FILES.inc(count, reason=reason)
+            logger.info(f"Skipped {count} files: {reason}")
+
+        logger.info(f"Extracted {len(source_files)} source files")
+        return source_files
+
+    except zipfile.BadZipFile:
+        raise ValueError("Invalid ZIP file")
+    except Exception as e:
+        logger.error(f"Error extracting source files: {e}")
+        raise
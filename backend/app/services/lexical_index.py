@@ -0,0 +1,74 @@
+import math
+import re
+from collections import Counter
+from typing import List, Tuple
+import numpy as np
+
+from app.services.vector_index import top_k_indices
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Identifier-aware tokens: each identifier as a whole plus its snake_case and camelCase parts.
+
+    getUserName yields getusername, get, user, name; build_index yields build_index, build, index.
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = [p.lower() for piece in word.split("_") for p in _CAMEL_PARTS.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return [t for t in tokens if len(t) > 1]
+
+
+class LexicalIndex:
+    """BM25 inverted index over code chunks"""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+
+        postings = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for doc_id, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            lengths[doc_id] = sum(counts.values())
+            for token, count in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(doc_id)
+                postings[token][1].append(count)
+
+        # Store postings as compact arrays: token -> (doc ids, term frequencies)
+        self.postings = {
+            token: (np.asarray(ids, dtype=np.int32), np.asarray(freqs, dtype=np.float32))
+            for token, (ids, freqs) in postings.items()
+        }
+        avg_length = float(lengths.mean()) if self.size else 0.0
+        # Per-document length normalization, precomputed once
+        self._norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(self.size, k1, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _idf(self, doc_freq: int) -> float:
+        return math.log(1 + (self.size - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            ids, freqs = self.postings[token]
+            scores[ids] += self._idf(len(ids)) * freqs * (self.k1 + 1) / (freqs + self._norm[ids])
+        return scores
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Return (document, score) pairs for the best top_k matching documents"""
+        scores = self.scores(query)
+        return [(int(i), float(scores[i])) for i in top_k_indices(scores, top_k) if scores[i] > 0]
@@ -0,0 +1,227 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Sequence, Tuple
+
+# Add Server-Timing headers with the stage durations of each request
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage timings of the current request, for the Server-Timing header
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge:
+    """Value that goes up and down, with optional labels"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """Cumulative histogram with optional labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts with a final +Inf bucket, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "codemind_stage_duration_seconds", "Time spent in each processing stage", ["stage"]
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "codemind_http_request_duration_seconds", "Time until the response headers are sent", ["method", "route", "status"]
+))
+UPLOAD_BYTES = REGISTRY.register(Counter(
+    "codemind_upload_bytes_total", "Bytes of uploaded ZIP archives"
+))
+EXTRACTED_FILES = REGISTRY.register(Counter(
+    "codemind_extracted_files_total", "Source files read from uploaded archives"
+))
+EXTRACTED_BYTES = REGISTRY.register(Counter(
+    "codemind_extracted_bytes_total", "Uncompressed bytes of source files read from uploaded archives"
+))
+SKIPPED_FILES = REGISTRY.register(Counter(
+    "codemind_skipped_files_total", "Source files in uploaded archives that were not ingested, by reason", ["reason"]
+))
+CHUNKS = REGISTRY.register(Counter(
+    "codemind_chunks_total", "Code chunks produced by chunking"
+))
+EMBEDDING_TEXTS = REGISTRY.register(Counter(
+    "codemind_embedding_texts_total", "Texts to embed, by whether the vector came from the cache or the API", ["source"]
+))
+EMBEDDING_TOKENS = REGISTRY.register(Counter(
+    "codemind_embedding_tokens_total", "Estimated tokens sent to the embeddings API"
+))
+COMPLETION_TOKENS = REGISTRY.register(Counter(
+    "codemind_completion_tokens_total", "Tokens of completion requests as reported by the API", ["kind"]
+))
+CONTEXT_TOKENS = REGISTRY.register(Histogram(
+    "codemind_context_tokens", "Estimated tokens of repository context per prompt", ["kind"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+))
+COMPLETION_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "codemind_completion_first_token_seconds", "Time until the first streamed completion token"
+))
+
+UPSTREAM_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "codemind_upstream_queue_depth", "Upstream API requests waiting for the scheduler, by priority lane", ["lane"]
+))
+UPSTREAM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "codemind_upstream_in_flight", "Upstream API requests in progress"
+))
+UPSTREAM_WAIT = REGISTRY.register(Histogram(
+    "codemind_upstream_wait_seconds", "Time upstream API requests waited in the scheduler queue, by priority lane", ["lane"]
+))
+UPSTREAM_RATE_LIMITED = REGISTRY.register(Counter(
+    "codemind_upstream_rate_limited_total", "Upstream API responses with status 429"
+))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as a processing stage, for the stage histogram and the Server-Timing header"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, duration))
+
+
+def start_request_spans() -> List[Tuple[str, float]]:
+    """Start collecting stage timings for the current request"""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing_header(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing value with the summed duration of each stage in milliseconds"""
+    durations: Dict[str, float] = {}
+    for stage, duration in spans:
+        durations[stage] = durations.get(stage, 0.0) + duration
+    durations["total"] = total
+    return ", ".join(f"{stage};dur={duration * 1000:.1f}" for stage, duration in durations.items())
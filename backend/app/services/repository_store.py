@@ -0,0 +1,483 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import logging
+
+from app.services.code_graph import CodeGraph
+from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Jobs that haven't reported progress for this long are assumed lost with their worker
+STALE_JOB_SECONDS = 15 * 60
+# Finished jobs are kept this long so clients can still poll them
+JOB_RETENTION_SECONDS = 24 * 60 * 60
+# A repository's last use is written at most this often per worker, so reads rarely write
+LAST_USED_INTERVAL = 60
+# Memory a loaded repository takes per byte of its stored text (file contents, chunk, symbol
+# and graph JSON): parsed dicts, per-string overhead and the BM25 index built on first search.
+# Measured at 3.5-3.75 on synthetic repositories of 60 to 1500 files
+MEMORY_PER_STORED_BYTE = 3.5
+
+_JOB_FIELDS = ('id', 'repo_id', 'name', 'status', 'files_scanned', 'chunks_total', 'chunks_embedded', 'error')
+
+
+def new_repository_id() -> str:
+    """Random repository id, unique across workers and restarts"""
+    return f"repo_{uuid.uuid4().hex[:16]}"
+
+
+class RepositoryStore:
+    """Durable repository and upload job storage shared by every worker.
+
+    Repository metadata, file contents, chunks, symbols, code graphs and jobs live in one SQLite
+    database; each repository's vectors are a .npy file that is memory-mapped when the
+    repository is loaded. Up to cache_size recently used repositories, and no more than
+    memory_budget bytes of them, are kept loaded in memory, and a version number tells a
+    worker when another worker replaced one.
+
+    evict removes whole repositories unused for ttl seconds, then the least recently
+    used ones until the store fits in disk_budget bytes (0 disables either limit).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        cache_size: int = 8,
+        memory_budget: int = 0,
+        disk_budget: int = 0,
+        ttl: float = 0
+    ):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.ttl = ttl
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._last_used_written: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Loads happen outside _lock, each on its thread's own read connection; one per
+        # repository at a time, so concurrent requests for a cold repository load it once
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._readers = threading.local()
+
+        self.path = os.path.join(directory, "store.sqlite3")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The shared write connection, opened and migrated on first use rather than at import"""
+        if self._connection is None:
+            with self._open_lock:
+                if self._connection is None:
+                    self._connection = self._open()
+        return self._connection
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conn.executescript(
+            """CREATE TABLE IF NOT EXISTS repositories (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                uploaded_at TEXT NOT NULL,
+                file_count INTEGER NOT NULL,
+                chunks TEXT NOT NULL,
+                symbols TEXT NOT NULL,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                repo_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                sha256 TEXT,
+                content TEXT NOT NULL,
+                PRIMARY KEY (repo_id, path)
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                repo_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                files_scanned INTEGER NOT NULL,
+                chunks_total INTEGER NOT NULL,
+                chunks_embedded INTEGER NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_repo_id ON jobs (repo_id);"""
+        )
+        # Columns added after the first version of the schema
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(repositories)")}
+        if 'last_used' not in columns:
+            conn.execute("ALTER TABLE repositories ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        if 'disk_bytes' not in columns:
+            conn.execute("ALTER TABLE repositories ADD COLUMN disk_bytes INTEGER NOT NULL DEFAULT 0")
+        if 'graph' not in columns:
+            # NULL for repositories stored before code graphs, which are then built on first use
+            conn.execute("ALTER TABLE repositories ADD COLUMN graph TEXT")
+        conn.commit()
+        return conn
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _vectors_path(self, repo_id: str, version: int) -> str:
+        return os.path.join(self.directory, repo_id, f"vectors.{version}.npy")
+
+    # Repositories
+
+    def get(self, repo_id: str) -> Optional[Dict[str, Any]]:
+        """Load a repository, from the in-memory cache when it is current.
+
+        Loading from the database happens outside the store lock, so a large cold
+        repository doesn't hold up other repositories' reads or job saves.
+        """
+        with self._lock:
+            version = self._version(repo_id)
+            if version is None:
+                self._cache.pop(repo_id, None)
+                return None
+
+            now = time.time()
+            if now - self._last_used_written.get(repo_id, 0) >= LAST_USED_INTERVAL:
+                self._last_used_written[repo_id] = now
+                with self._conn:
+                    self._conn.execute("UPDATE repositories SET last_used = ? WHERE id = ?", (now, repo_id))
+
+            cached = self._current(repo_id, version)
+            if cached is not None:
+                return cached
+            load_lock = self._load_locks.setdefault(repo_id, threading.Lock())
+
+        with load_lock:
+            # Another thread may have loaded it while this one waited
+            with self._lock:
+                cached = self._current(repo_id, version)
+            if cached is not None:
+                return cached
+            return self._load_and_remember(repo_id)
+
+    def _version(self, repo_id: str) -> Optional[int]:
+        """Stored version of a repository (None if there is none); callers hold the lock"""
+        row = self._conn.execute("SELECT version FROM repositories WHERE id = ?", (repo_id,)).fetchone()
+        return row[0] if row else None
+
+    def _current(self, repo_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """The loaded repository if it is at least version; callers hold the lock"""
+        cached = self._cache.get(repo_id)
+        if cached is None or cached['version'] < version:
+            return None
+        self._cache.move_to_end(repo_id)
+        return cached
+
+    def _load_and_remember(self, repo_id: str) -> Optional[Dict[str, Any]]:
+        """Load a repository without the store lock, keeping it loaded if it is still current"""
+        repo = None
+        # A version stored by another worker mid-load can remove the vectors file being
+        # opened, so a load that turns out to be stale is retried
+        for _ in range(3):
+            repo = self._load(repo_id)
+            if repo is None:
+                return None
+            with self._lock:
+                if self._version(repo_id) == repo['version']:
+                    self._remember(repo)
+                    return repo
+        return repo
+
+    def warm(self, limit: int) -> List[Dict[str, Any]]:
+        """Load the most recently used repositories into memory ahead of their first request.
+
+        Doesn't count as a use, so eviction order is unaffected. Returns the loaded repositories.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM repositories ORDER BY last_used DESC LIMIT ?", (min(limit, self.cache_size),)
+            ).fetchall()
+
+        loaded = []
+        # Least recently used first, so the most recent ends up last in the cache's LRU order
+        for (repo_id,) in reversed(rows):
+            with self._lock:
+                if repo_id in self._cache:
+                    continue
+                load_lock = self._load_locks.setdefault(repo_id, threading.Lock())
+            with load_lock:
+                with self._lock:
+                    if repo_id in self._cache:
+                        continue
+                try:
+                    repo = self._load_and_remember(repo_id)
+                except Exception as e:
+                    logger.warning(f"Could not preload repository {repo_id}: {e}")
+                    continue
+            if repo is not None:
+                loaded.append(repo)
+        return loaded
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection, used to load repositories outside the store lock"""
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    def _load(self, repo_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._reader()
+        # One read transaction, so the metadata and files come from the same version
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT name, uploaded_at, file_count, chunks, symbols, graph, version FROM repositories WHERE id = ?",
+                (repo_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            name, uploaded_at, file_count, chunks, symbols, graph, version = row
+            files = [
+                {'path': path, 'content': content, 'size': len(content), 'sha256': sha256}
+                for path, sha256, content in conn.execute(
+                    "SELECT path, sha256, content FROM files WHERE repo_id = ? ORDER BY rowid", (repo_id,)
+                )
+            ]
+        finally:
+            conn.execute("COMMIT")
+
+        stored_bytes = len(chunks) + len(symbols) + len(graph or '') + sum(f['size'] for f in files)
+        vectors_path = self._vectors_path(repo_id, version)
+        try:
+            vector_index = VectorIndex.load(vectors_path) if os.path.exists(vectors_path) else None
+        except FileNotFoundError:
+            # Replaced by a newer version in the meantime; the caller sees the version change
+            vector_index = None
+
+        return {
+            'id': repo_id,
+            'name': name,
+            'files': files,
+            'uploaded_at': uploaded_at,
+            'file_count': file_count,
+            'chunks': json.loads(chunks),
+            'symbols': json.loads(symbols),
+            'code_graph': CodeGraph(json.loads(graph)) if graph else None,
+            # Rebuilt from the chunks on first search
+            'lexical_index': None,
+            'vector_index': vector_index,
+            'version': version,
+            'memory_bytes': int(MEMORY_PER_STORED_BYTE * stored_bytes)
+        }
+
+    def _remember(self, repo: Dict[str, Any]):
+        """Keep a repository loaded, unloading the least recently used ones over the limits"""
+        self._cache[repo['id']] = repo
+        self._cache.move_to_end(repo['id'])
+        while len(self._cache) > 1 and (
+            len(self._cache) > self.cache_size
+            or (self.memory_budget and self._memory_bytes() > self.memory_budget)
+        ):
+            self._cache.popitem(last=False)
+
+    def _memory_bytes(self) -> int:
+        """Estimated memory of the loaded repositories (vectors are memory-mapped and not counted)"""
+        return sum(repo.get('memory_bytes', 0) for repo in self._cache.values())
+
+    def put(self, repo: Dict[str, Any]):
+        """Store a new repository or replace every file and index of an existing one"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE repo_id = ?", (repo['id'],))
+            self._conn.executemany(
+                "INSERT INTO files (repo_id, path, sha256, content) VALUES (?, ?, ?, ?)",
+                [(repo['id'], f['path'], f.get('sha256'), f['content']) for f in repo['files']]
+            )
+            self._write_index(repo)
+            self._remember(repo)
+
+    def save_index(self, repo: Dict[str, Any]) -> bool:
+        """Store a repository's rebuilt chunks, symbols, code graph and vectors, keeping its files.
+
+        Returns False without storing anything when the repository was deleted or replaced
+        since repo's version was loaded.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT version FROM repositories WHERE id = ?", (repo['id'],)).fetchone()
+            if row is None or row[0] != repo.get('version'):
+                return False
+            self._write_index(repo)
+            self._remember(repo)
+            return True
+
+    def _write_index(self, repo: Dict[str, Any]):
+        """Write the metadata and index under a new version; callers hold the lock and a transaction"""
+        row = self._conn.execute("SELECT version FROM repositories WHERE id = ?", (repo['id'],)).fetchone()
+        version = row[0] + 1 if row else 1
+
+        # Each version gets its own vectors file, so workers that still have the previous
+        # one memory-mapped keep reading consistent data
+        vectors_bytes = 0
+        if repo.get('vector_index') is not None:
+            vectors_path = self._vectors_path(repo['id'], version)
+            os.makedirs(os.path.join(self.directory, repo['id']), exist_ok=True)
+            repo['vector_index'].save(vectors_path)
+            repo['vector_index'] = VectorIndex.load(vectors_path)
+            vectors_bytes = sum(os.path.getsize(p) for p in VectorIndex.paths(vectors_path) if os.path.exists(p))
+
+        chunks = json.dumps(repo['chunks'])
+        symbols = json.dumps(repo['symbols'])
+        graph = json.dumps(repo['code_graph'].data, separators=(',', ':')) if repo.get('code_graph') is not None else None
+        stored_bytes = len(chunks) + len(symbols) + len(graph or '') + sum(len(f['content']) for f in repo['files'])
+        repo['memory_bytes'] = int(MEMORY_PER_STORED_BYTE * stored_bytes)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO repositories (id, name, uploaded_at, file_count, chunks, symbols, graph, version, "
+            "last_used, disk_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (repo['id'], repo['name'], repo['uploaded_at'], repo['file_count'], chunks, symbols, graph, version,
+             time.time(), stored_bytes + vectors_bytes)
+        )
+        repo['version'] = version
+
+        if row:
+            for old_path in VectorIndex.paths(self._vectors_path(repo['id'], row[0])):
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+
+    def delete(self, repo_id: str):
+        """Remove a repository with its files and vectors"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE repo_id = ?", (repo_id,))
+            self._conn.execute("DELETE FROM repositories WHERE id = ?", (repo_id,))
+            self._cache.pop(repo_id, None)
+            self._last_used_written.pop(repo_id, None)
+            self._load_locks.pop(repo_id, None)
+        shutil.rmtree(os.path.join(self.directory, repo_id), ignore_errors=True)
+
+    def exists(self, repo_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM repositories WHERE id = ?", (repo_id,)).fetchone() is not None
+
+    def metadata(self, repo_id: str) -> Optional[Dict[str, Any]]:
+        """id, name, uploaded_at and file_count of a repository, without loading it"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, name, uploaded_at, file_count FROM repositories WHERE id = ?", (repo_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'name', 'uploaded_at', 'file_count'), row))
+
+    def list_repositories(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, uploaded_at, file_count FROM repositories ORDER BY uploaded_at"
+            ).fetchall()
+        return [dict(zip(('id', 'name', 'uploaded_at', 'file_count'), row)) for row in rows]
+
+    def evict(self) -> List[str]:
+        """Delete expired repositories, then least recently used ones over the disk budget.
+
+        Repositories with an upload job in progress are kept. Returns the deleted ids.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, last_used, disk_bytes FROM repositories ORDER BY last_used"
+            ).fetchall()
+            candidates = [row for row in rows if not self._running_job(row[0])]
+
+        now = time.time()
+        total = sum(row[2] for row in rows)
+        evicted = []
+        for repo_id, last_used, disk_bytes in candidates:
+            expired = self.ttl and last_used < now - self.ttl
+            over_budget = self.disk_budget and total > self.disk_budget
+            if not (expired or over_budget):
+                continue
+            self.delete(repo_id)
+            total -= disk_bytes
+            evicted.append(repo_id)
+            logger.info(f"Evicted repository {repo_id} ({'expired' if expired else 'over disk budget'})")
+        return evicted
+
+    def usage(self) -> Dict[str, Any]:
+        """Repository counts and sizes against the configured budgets"""
+        with self._lock:
+            count, disk_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(disk_bytes), 0) FROM repositories"
+            ).fetchone()
+            return {
+                "repositories": count,
+                "disk_bytes": disk_bytes,
+                "disk_budget_bytes": self.disk_budget or None,
+                "loaded_repositories": len(self._cache),
+                "memory_bytes": self._memory_bytes(),
+                "memory_budget_bytes": self.memory_budget or None,
+                "ttl_seconds": self.ttl or None
+            }
+
+    # Upload jobs
+
+    def _running_job(self, repo_id: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM jobs WHERE repo_id = ? AND status NOT IN ('completed', 'failed') AND updated_at > ?",
+            (repo_id, time.time() - STALE_JOB_SECONDS)
+        ).fetchone() is not None
+
+    def is_processing(self, repo_id: str) -> bool:
+        """Whether an upload job for the repository is still running in any worker"""
+        with self._lock:
+            return self._running_job(repo_id)
+
+    def create_job(self, job: Dict[str, Any]) -> bool:
+        """Register a new upload job, unless another job for the same repository is running"""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._running_job(job['repo_id']):
+                return False
+            self._insert_job(job)
+            return True
+
+    def save_job(self, job: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._insert_job(job)
+
+    def _insert_job(self, job: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, repo_id, name, status, files_scanned, chunks_total, "
+            "chunks_embedded, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            tuple(job[field] for field in _JOB_FIELDS) + (time.time(),)
+        )
+
+    def prune_jobs(self, max_age: float = JOB_RETENTION_SECONDS) -> int:
+        """Delete finished (or abandoned) jobs that haven't been updated for max_age seconds"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE updated_at < ? AND (status IN ('completed', 'failed') OR updated_at < ?)",
+                (time.time() - max_age, time.time() - STALE_JOB_SECONDS)
+            )
+            return cursor.rowcount
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(_JOB_FIELDS, row)) if row else None
+
+
+repository_store = RepositoryStore(
+    os.getenv("REPOSITORY_STORE_DIR", ".cache/repositories"),
+    cache_size=int(os.getenv("REPOSITORY_CACHE_SIZE", 8)),
+    memory_budget=int(float(os.getenv("REPOSITORY_MEMORY_BUDGET_MB", 512)) * 1024 * 1024),
+    disk_budget=int(float(os.getenv("REPOSITORY_DISK_BUDGET_MB", 0)) * 1024 * 1024),
+    ttl=float(os.getenv("REPOSITORY_TTL_HOURS", 0)) * 3600
+)
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Hashable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def repository_hash(repo: Dict[str, Any]) -> str:
+    """Hash of a repository's file paths and contents, cached on the repository"""
+    if 'content_hash' not in repo:
+        digest = hashlib.sha256()
+        for file_info in sorted(repo['files'], key=lambda f: f['path']):
+            digest.update(file_info['path'].encode("utf-8"))
+            digest.update(b"\0")
+            digest.update((file_info.get('sha256') or hashlib.sha256(file_info['content'].encode("utf-8")).hexdigest()).encode())
+        repo['content_hash'] = digest.hexdigest()
+    return repo['content_hash']
+
+
+def normalize_question(question: str) -> str:
+    """Whitespace and trailing punctuation don't change the answer; case does, since
+    symbol lookup is case-sensitive (Config and config can be different definitions)"""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ")
+
+
+class StreamedResponse:
+    """A response being streamed, which every request for the same key follows.
+
+    The computation sets details (what is known before the first token) and appends
+    tokens; followers get the details and then every token from the start.
+    """
+
+    def __init__(self):
+        self.details: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.tokens: List[str] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self._updated = asyncio.Event()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def append(self, token: str):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        if not self.details.done():
+            self.details.set_exception(error or RuntimeError("Response ended before its details were known"))
+            # Followers that never asked for the details shouldn't trigger "exception never retrieved"
+            self.details.exception()
+        self.finished = True
+        self.error = error
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        sent = 0
+        while True:
+            updated = self._updated
+            while sent < len(self.tokens):
+                yield self.tokens[sent]
+                sent += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await updated.wait()
+
+
+class ResponseCache:
+    """In-memory cache of generated responses with a TTL and LRU eviction.
+
+    Concurrent requests for the same key share one computation, so only one upstream
+    call goes out, whether they stream the response or not; it runs in its own task, so a
+    client disconnecting doesn't cancel it for the others.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, StreamedResponse] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for key, if any (counted as a hit when found)"""
+        value = self._lookup(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def _lookup(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Tuple[Any, bool]]]) -> Any:
+        """Return the cached value for key, or compute it once for all concurrent callers.
+
+        compute returns (value, cacheable); values that aren't cacheable (like fallback
+        answers while the upstream is down) are returned without being stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def get_or_stream(
+        self,
+        key: Hashable,
+        compute: Callable[[StreamedResponse], Awaitable[Tuple[Any, bool]]]
+    ) -> Tuple[Optional[Any], Optional[StreamedResponse]]:
+        """Streaming variant of get_or_compute, returning (cached value, None) or (None, stream).
+
+        compute fills the StreamedResponse it is given as it goes and returns (value,
+        cacheable) like get_or_compute's. Concurrent requests for the key follow the same
+        stream; one arriving while a non-streaming computation runs waits for its value.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, None
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            stream = self._streams.get(key)
+            if stream is None:
+                return await asyncio.shield(task), None
+            return None, stream
+
+        self.misses += 1
+        stream = StreamedResponse()
+        self._streams[key] = stream
+        task = asyncio.ensure_future(self._compute(key, lambda: compute(stream)))
+        task.add_done_callback(lambda done: stream.finish(
+            asyncio.CancelledError() if done.cancelled() else done.exception()
+        ))
+        self._inflight[key] = task
+        return None, stream
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Tuple[Any, bool]]]) -> Any:
+        try:
+            value, cacheable = await compute()
+            if cacheable:
+                self.put(key, value)
+            return value
+        finally:
+            del self._inflight[key]
+            self._streams.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        # Coalesced requests were served without their own upstream call, so they count as hits
+        served = self.hits + self.coalesced
+        lookups = served + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
+)
@@ -0,0 +1,74 @@
+import asyncio
+import os
+from typing import List, Dict, Any
+import logging
+import numpy as np
+
+from app.services.lexical_index import LexicalIndex
+from app.services.metrics import stage_timer
+from app.services.vector_index import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Share of the hybrid score that comes from BM25, the rest comes from vector similarity
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", 0.4))
+
+
+def chunk_document(chunk: Dict[str, Any]) -> str:
+    """Text indexed for a chunk: its path and qualified name make identifiers searchable too"""
+    return f"{chunk['file']} {chunk.get('qualname', '')}\n{chunk['content']}"
+
+
+def build_lexical_index(chunks: List[Dict[str, Any]]) -> LexicalIndex:
+    return LexicalIndex([chunk_document(c) for c in chunks])
+
+
+def _rescale(scores: np.ndarray) -> np.ndarray:
+    """Min-max scale scores to 0..1 so vector and BM25 scores can be added"""
+    if not len(scores):
+        return scores
+    low, high = float(scores.min()), float(scores.max())
+    if high <= low:
+        return np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+def hybrid_scores(vector_scores: np.ndarray, lexical_scores: np.ndarray, lexical_weight: float = HYBRID_LEXICAL_WEIGHT) -> np.ndarray:
+    """Weighted sum of rescaled vector similarity and BM25 scores"""
+    return (1 - lexical_weight) * _rescale(vector_scores) + lexical_weight * _rescale(lexical_scores)
+
+
+async def search_chunks(repo: Dict[str, Any], query: str, top_k: int, embedding_service) -> List[Dict[str, Any]]:
+    """Find the chunks most relevant to a query with hybrid lexical + vector retrieval.
+
+    Uses BM25 alone when the repository has no vectors or the query can't be embedded
+    (e.g. without an API key). Returns copies of the chunks with a relevance_score.
+    """
+    chunks = repo['chunks']
+    if not chunks:
+        return []
+
+    # Not stored, so the first search after a repository is loaded builds it, which takes
+    # seconds for large repositories: in a worker thread to keep the event loop free
+    if repo.get('lexical_index') is None:
+        with stage_timer("lexical_index"):
+            repo['lexical_index'] = await asyncio.to_thread(build_lexical_index, chunks)
+
+    query_vector = None
+    if embedding_service.client and repo.get('vector_index') is not None:
+        try:
+            query_vector = (await embedding_service.embed_texts([query], key=repo['id']))[0]
+        except Exception as e:
+            logger.warning(f"Could not embed query, using lexical retrieval only: {e}")
+
+    with stage_timer("similarity_search"):
+        scores = repo['lexical_index'].scores(query)
+        if query_vector is not None:
+            scores = hybrid_scores(repo['vector_index'].scores(query_vector), scores)
+        top = top_k_indices(scores, top_k)
+
+    return [
+        {**chunks[i], "relevance_score": float(scores[i])}
+        for i in top
+        if scores[i] > 0
+    ]
@@ -0,0 +1,294 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Deque, Dict, Mapping, Optional, Tuple
+import logging
+
+from app.services.metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH, UPSTREAM_RATE_LIMITED, UPSTREAM_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: interactive requests (chat) are always dispatched before background ones
+# (indexing embeddings, documentation)
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, BACKGROUND)
+
+# Longest pause taken from a Retry-After or reset header; beyond that the request is failed
+MAX_RATE_LIMIT_WAIT = float(os.getenv("UPSTREAM_MAX_RATE_LIMIT_WAIT", 30))
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_delay(value: Optional[str], now: float) -> Optional[float]:
+    """Seconds until a rate-limit reset or retry, from any of the header formats in use:
+    seconds ("20"), Unix timestamps in seconds or milliseconds (OpenRouter's X-RateLimit-Reset),
+    durations ("1m30s", "250ms") and HTTP dates (Retry-After)
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if parts and "".join(n + u for n, u in parts) == value:
+            return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - now, 0.0)
+        except (TypeError, ValueError):
+            return None
+    if number > 1e12:
+        return max(number / 1000 - now, 0.0)
+    if number > 1e9:
+        return max(number - now, 0.0)
+    return max(number, 0.0)
+
+
+def _header(headers: Mapping[str, str], *names: str) -> Optional[str]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+class UpstreamScheduler:
+    """Admission control for every call to the upstream API, which all users share through one key.
+
+    Requests wait in one of two priority lanes; within a lane each key (a repository id)
+    has its own queue and keys take turns, so one large upload can't starve the others.
+    A request is dispatched when a concurrency slot is free and the rate limit allows it:
+    a local token bucket (requests_per_minute, 0 to rely on the upstream alone), the
+    remaining requests reported by the upstream's rate-limit headers, and any pause from
+    a 429's Retry-After. Background requests can't take the last reserved_interactive slots.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        requests_per_minute: float = 0,
+        burst: Optional[int] = None,
+        reserved_interactive: int = 2
+    ):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.reserved_interactive = min(max(reserved_interactive, 0), self.max_concurrency - 1)
+        self.rate = requests_per_minute / 60
+        self.capacity = float(burst or max(int(requests_per_minute // 6), 1))
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+
+        # Rate-limit state reported by the upstream
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.window: Optional[float] = None
+        self.paused_until = 0.0
+        self.rate_limited = 0
+
+        self.in_flight = 0
+        self._queues: Dict[str, "OrderedDict[str, Deque[Tuple[asyncio.Future, float]]]"] = {
+            lane: OrderedDict() for lane in LANES
+        }
+        self._waits: Dict[str, Tuple[int, float]] = {lane: (0, 0.0) for lane in LANES}
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def queued(self, lane: str) -> int:
+        return sum(len(queue) for queue in self._queues[lane].values())
+
+    @asynccontextmanager
+    async def slot(self, priority: str = INTERACTIVE, key: str = "") -> AsyncIterator[None]:
+        """Wait for permission to send one upstream request and hold it for the duration"""
+        await self.acquire(priority, key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: str = INTERACTIVE, key: str = ""):
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        entry = (waiter, time.monotonic())
+        queues = self._queues[priority]
+        queues.setdefault(key, deque()).append(entry)
+        UPSTREAM_QUEUE_DEPTH.inc(lane=priority)
+        self._dispatch()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just before the cancellation: hand the slot on
+                self.release()
+            else:
+                queue = queues.get(key)
+                if queue is not None and entry in queue:
+                    queue.remove(entry)
+                    UPSTREAM_QUEUE_DEPTH.dec(lane=priority)
+                    if not queue:
+                        del queues[key]
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        UPSTREAM_IN_FLIGHT.dec()
+        self._dispatch()
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> bool:
+        """Update the rate-limit state from an upstream response's status and headers.
+
+        Returns whether the request should be retried: a 429 whose wait is within
+        MAX_RATE_LIMIT_WAIT. The retry waits in the queue until the pause is over.
+        """
+        now = time.monotonic()
+        wall = time.time()
+
+        limit = _header(headers, "x-ratelimit-limit-requests", "x-ratelimit-limit")
+        remaining = _header(headers, "x-ratelimit-remaining-requests", "x-ratelimit-remaining")
+        reset = _parse_delay(_header(headers, "x-ratelimit-reset-requests", "x-ratelimit-reset"), wall)
+        try:
+            if limit is not None:
+                self.limit = int(float(limit))
+            if remaining is not None:
+                reported = int(float(remaining))
+                if self.remaining is None or now >= self.reset_at:
+                    self.remaining = reported
+                    self.reset_at = now + (reset if reset is not None else 60)
+                    if reset is not None:
+                        self.window = max(self.window or 0.0, reset)
+                else:
+                    # Within a window, responses to earlier requests report counts that
+                    # miss the requests dispatched since, so keep the lower local count
+                    # (and the later reset, as a window may start after the assumed one)
+                    self.remaining = min(self.remaining, reported)
+                    if reset is not None:
+                        self.reset_at = max(self.reset_at, now + reset)
+        except ValueError:
+            pass
+
+        if status_code == 429:
+            self.rate_limited += 1
+            UPSTREAM_RATE_LIMITED.inc()
+            retry_after = _parse_delay(headers.get("retry-after"), wall)
+            if retry_after is None:
+                retry_after = reset if reset is not None else 1.0
+            self.paused_until = max(self.paused_until, now + min(retry_after, MAX_RATE_LIMIT_WAIT))
+            logger.warning(f"Upstream rate limit hit, pausing requests for {min(retry_after, MAX_RATE_LIMIT_WAIT):.1f}s")
+            self._dispatch()
+            return retry_after <= MAX_RATE_LIMIT_WAIT
+
+        self._dispatch()
+        return False
+
+    def _admission_delay(self, now: float) -> float:
+        """Seconds until the rate limits admit another request (0 when one can go now)"""
+        delay = max(self.paused_until - now, 0.0)
+
+        if self.remaining is not None:
+            if now >= self.reset_at:
+                if self.limit is not None and self.window:
+                    # A new window starts with the full limit, until a response reports its count
+                    self.remaining = self.limit
+                    self.reset_at = now + self.window
+                else:
+                    self.remaining = None
+            elif self.remaining <= 0:
+                delay = max(delay, self.reset_at - now)
+
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens < 1:
+                delay = max(delay, (1 - self._tokens) / self.rate)
+        return delay
+
+    def _next_lane(self) -> Optional[str]:
+        for lane in LANES:
+            limit = self.max_concurrency if lane == INTERACTIVE else self.max_concurrency - self.reserved_interactive
+            if self._queues[lane] and self.in_flight < limit:
+                return lane
+        return None
+
+    def _dispatch(self):
+        while True:
+            lane = self._next_lane()
+            if lane is None:
+                return
+            now = time.monotonic()
+            delay = self._admission_delay(now)
+            if delay > 0:
+                self._schedule_wakeup(delay)
+                return
+
+            # Round-robin between keys: take the first key's oldest request, then move it to the back
+            queues = self._queues[lane]
+            key, queue = next(iter(queues.items()))
+            waiter, queued_at = queue.popleft()
+            if queue:
+                queues.move_to_end(key)
+            else:
+                del queues[key]
+            UPSTREAM_QUEUE_DEPTH.dec(lane=lane)
+            if waiter.done():
+                continue
+
+            waiter.set_result(None)
+            self.in_flight += 1
+            UPSTREAM_IN_FLIGHT.inc()
+            if self.rate > 0:
+                self._tokens -= 1
+            if self.remaining is not None:
+                self.remaining -= 1
+
+            wait = now - queued_at
+            UPSTREAM_WAIT.observe(wait, lane=lane)
+            count, total = self._waits[lane]
+            self._waits[lane] = (count + 1, total + wait)
+
+    def _schedule_wakeup(self, delay: float):
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            if self._wakeup.when() <= when and self._wakeup.when() > loop.time():
+                return
+            self._wakeup.cancel()
+        self._wakeup = loop.call_at(when, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        lanes = {}
+        for lane in LANES:
+            count, total = self._waits[lane]
+            lanes[lane] = {
+                "queued": self.queued(lane),
+                "keys": len(self._queues[lane]),
+                "dispatched": count,
+                "mean_wait_seconds": round(total / count, 4) if count else 0.0
+            }
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "requests_per_minute": round(self.rate * 60, 2),
+            "upstream_limit": self.limit,
+            "upstream_remaining": self.remaining if self.remaining is not None and now < self.reset_at else None,
+            "paused_seconds": round(max(self.paused_until - now, 0.0), 2),
+            "rate_limited": self.rate_limited,
+            "lanes": lanes
+        }
+
+
+upstream_scheduler = UpstreamScheduler(
+    max_concurrency=int(os.getenv("OPENROUTER_MAX_CONCURRENCY", 16)),
+    requests_per_minute=float(os.getenv("UPSTREAM_REQUESTS_PER_MINUTE", 0)),
+    burst=int(os.getenv("UPSTREAM_BURST", 0)) or None,
+    reserved_interactive=int(os.getenv("UPSTREAM_INTERACTIVE_RESERVED", 2))
+)
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Iterable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_QUERY_BATCH = 500
+
+
+class SQLiteLRU:
+    """On-disk key-value table with LRU eviction, shared by the embedding and summary caches.
+
+    Rows are keyed by key_columns: lookups and stores name every key column but the last
+    (the scope, e.g. the model) and a set of values for the last one (e.g. content hashes).
+    Lookups refresh last_used, and stores evict the least recently used rows beyond
+    max_entries.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str,
+        key_columns: Tuple[str, ...],
+        value_column: str,
+        value_type: str,
+        max_entries: int
+    ):
+        self.path = path
+        self.table = table
+        self.key_columns = key_columns
+        self.value_column = value_column
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._value_type = value_type
+        self._connection: Optional[sqlite3.Connection] = None
+
+        *scope_columns, key_column = key_columns
+        scope_filter = "".join(f"{column} = ? AND " for column in scope_columns)
+        self._select = f"SELECT {key_column}, {value_column} FROM {table} WHERE {scope_filter}{key_column} IN "
+        self._touch = f"UPDATE {table} SET last_used = ? WHERE {scope_filter}{key_column} = ?"
+        self._insert = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(key_columns)}, {value_column}, last_used) "
+            f"VALUES ({', '.join('?' * (len(key_columns) + 2))})"
+        )
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The cache database, opened on first use (under _lock) rather than at import"""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            columns = "".join(f"{column} TEXT NOT NULL,\n" for column in self.key_columns)
+            conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                    {columns}{self.value_column} {self._value_type} NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY ({', '.join(self.key_columns)})
+                )"""
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table} (last_used)")
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def lookup(self, scope: Tuple[str, ...], keys: Iterable[str]) -> Dict[str, Any]:
+        """Stored values for keys within scope, refreshing their LRU timestamp"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_BATCH):
+                batch = keys[start:start + _QUERY_BATCH]
+                rows = self._conn.execute(
+                    f"{self._select}({','.join('?' * len(batch))})", [*scope, *batch]
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                self._conn.executemany(self._touch, [(now, *scope, key) for key in found])
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def store(self, scope: Tuple[str, ...], values: Dict[str, Any]):
+        """Store values within scope and evict the least recently used rows beyond max_entries"""
+        if not values:
+            return
+        now = time.time()
+
+        with self._lock:
+            self._conn.executemany(self._insert, [(*scope, key, value, now) for key, value in values.items()])
+
+            (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE rowid IN "
+                    f"(SELECT rowid FROM {self.table} ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                logger.info(f"Evicted {excess} least recently used entries from the {self.table} cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (entries,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -1,64 +1,32 @@
+import json
 import os
-import zipfile
-from pathlib import Path
-from typing import List, Dict, Any
+import tempfile
+from typing import Any, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def extract_python_files(zip_path: str, temp_dir: str) -> List[Dict[str, Any]]:
-    """Extract Python files from uploaded ZIP"""
-    
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about 4 characters per token for code and English)"""
+    return len(text) // 4 + 1
+
+# Keep proxies from buffering server-sent event streams
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def format_sse(data: Any, event: Optional[str] = None) -> str:
+    """Format one server-sent event with a JSON payload"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+# Uploaded archives are staged here until their upload job finishes
+UPLOAD_TEMP_DIR = os.getenv("UPLOAD_TEMP_DIR") or os.path.join(tempfile.gettempdir(), "codemind-uploads")
+
+def remove_file(path: str):
+    """Delete a temporary file if it still exists"""
     try:
-        # Extract ZIP file
-        extract_dir = os.path.join(temp_dir, "extracted")
-        os.makedirs(extract_dir, exist_ok=True)
-        
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        # Find Python files
-        python_files = []
-        
-        for root, dirs, files in os.walk(extract_dir):
-            # Skip common directories that don't contain source code
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['__pycache__', 'node_modules', 'venv', 'env']]
-            
-            for file in files:
-                if file.endswith('.py'):
-                    file_path = os.path.join(root, file)
-                    try:
-                        # Try different encodings
-                        content = None
-                        for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                            try:
-                                with open(file_path, 'r', encoding=encoding) as py_file:
-                                    content = py_file.read()
-                                break
-                            except UnicodeDecodeError:
-                                continue
-                        
-                        if content is not None:
-                            relative_path = os.path.relpath(file_path, extract_dir)
-                            python_files.append({
-                                'path': relative_path,
-                                'content': content,
-                                'size': len(content)
-                            })
-                        else:
-                            logger.warning(f"Could not decode file {file_path}")
-                            
-                    except Exception as e:
-                        logger.warning(f"Could not read file {file_path}: {e}")
-        
-        logger.info(f"Extracted {len(python_files)} Python files")
-        return python_files
-        
-    except zipfile.BadZipFile:
-        raise ValueError("Invalid ZIP file")
-    except Exception as e:
-        logger.error(f"Error extracting Python files: {e}")
-        raise
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 def clean_temp_directory(temp_dir: str):
     """Clean up temporary directory"""
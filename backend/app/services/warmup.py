@@ -0,0 +1,57 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+import logging
+
+from app.services.code_graph import get_code_graph
+from app.services.context_builder import get_outline
+from app.services.metrics import stage_timer
+from app.services.retrieval import build_lexical_index
+
+logger = logging.getLogger(__name__)
+
+# Most recently used repositories each worker loads from the store at startup (0 disables)
+WARMUP_REPOSITORIES = int(os.getenv("STARTUP_WARMUP_REPOSITORIES", 2))
+
+
+def _import_clients():
+    """Import the packages the upstream API clients are made from"""
+    import httpx  # noqa: F401
+    import openai  # noqa: F401
+
+
+def _build_indexes(repos: List[Dict[str, Any]]):
+    """Build what the first request about a repository would build: its BM25 index, a code
+    graph for repositories stored before code graphs, and the file outlines used in
+    whole-repository context
+    """
+    for repo in repos:
+        if repo.get('lexical_index') is None:
+            repo['lexical_index'] = build_lexical_index(repo['chunks'])
+        if repo.get('code_graph') is None:
+            get_code_graph(repo)
+        for file_info in repo['files']:
+            get_outline(file_info)
+
+
+async def warm_up(repository_store, ai_service, embedding_service):
+    """Prepare what the first requests would otherwise wait for, after the server is accepting requests.
+
+    Imports the openai and httpx packages in a worker thread and creates the upstream API
+    clients on the loop, then opens the store, loads the most recently used repositories
+    into memory and builds their in-memory indexes. Failures are logged; everything is
+    also done lazily on first use.
+    """
+    start = time.perf_counter()
+    try:
+        with stage_timer("warm_up"):
+            # The imports are the slow part; the clients are created on the loop that uses them.
+            # Creating them doesn't connect, so this sends nothing upstream
+            await asyncio.to_thread(_import_clients)
+            _ = ai_service.client, embedding_service.client
+            repos = await asyncio.to_thread(repository_store.warm, WARMUP_REPOSITORIES) if WARMUP_REPOSITORIES > 0 else []
+            await asyncio.to_thread(_build_indexes, repos)
+        logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s, {len(repos)} repositories loaded")
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
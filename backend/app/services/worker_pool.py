@@ -0,0 +1,83 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for CPU-bound ingestion (reading archives, chunking); 0 keeps it in-process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", min(os.cpu_count() or 1, 8)))
+# Repositories with fewer files than this are ingested in-process, where there is no
+# pickling overhead and no worker start-up cost
+PARALLEL_MIN_FILES = int(os.getenv("INGEST_PARALLEL_MIN_FILES", 500))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared ingestion pool, started on first use (None when INGEST_WORKERS is 0).
+
+    Workers are spawned rather than forked: the server process runs threads and an event
+    loop that must not be copied into the children.
+    """
+    global _pool
+    if INGEST_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the ingestion workers"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def split_batches(items: Sequence[Any], min_size: int = 50) -> List[List[Any]]:
+    """Split items into a few batches per worker, so a slow batch doesn't hold up the rest"""
+    batch_count = max(INGEST_WORKERS, 1) * 4
+    size = max(math.ceil(len(items) / batch_count), min_size)
+    return [list(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def map_batches(fn: Callable, batches: List[tuple], on_result: Optional[Callable[[Any], None]] = None) -> List[Any]:
+    """Call fn(*args) for every args tuple in the worker pool, returning results in order.
+
+    fn must be a module-level function. on_result is called with each result as it
+    arrives. This blocks, so run it off the event loop. If the pool is disabled or a
+    worker dies, the remaining batches run in this process.
+    """
+    results: List[Any] = [None] * len(batches)
+    done = [False] * len(batches)
+
+    def finish(index: int, result: Any):
+        results[index] = result
+        done[index] = True
+        if on_result:
+            on_result(result)
+
+    pool = get_pool()
+    if pool is not None:
+        try:
+            futures = {pool.submit(fn, *args): i for i, args in enumerate(batches)}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+            return results
+        except BrokenProcessPool as e:
+            logger.warning(f"Ingestion worker pool failed ({e}), continuing in-process")
+            shutdown_pool()
+
+    for i, args in enumerate(batches):
+        if not done[i]:
+            finish(i, fn(*args))
+    return results
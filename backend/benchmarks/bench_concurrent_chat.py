@@ -0,0 +1,71 @@
+"""Check that concurrent completions overlap instead of serializing the event loop.
+
+Runs AIService.generate_response against a mocked OpenRouter endpoint with a fixed
+latency, first once and then N times concurrently, while a ticker task measures how
+long the event loop is blocked.
+
+Usage (from the backend directory):
+    python benchmarks/bench_concurrent_chat.py [--concurrency 16] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+from app.services.ai_service import AIService  # noqa: E402
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst delay seen between ticks scheduled every interval seconds"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(concurrency: int, latency: float):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    service = AIService()
+    service._client = httpx.AsyncClient(base_url=service.base_url, transport=httpx.MockTransport(handler))
+
+    async def timed(n: int):
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(loop_lag(stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(service.generate_response("context", "question") for _ in range(n)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        return elapsed, await ticker
+
+    single, _ = await timed(1)
+    concurrent, lag = await timed(concurrency)
+    await service.aclose()
+
+    print(f"upstream latency:            {latency * 1000:.0f} ms")
+    print(f"1 request:                   {single * 1000:.0f} ms")
+    print(f"{concurrency} concurrent requests:      {concurrent * 1000:.0f} ms "
+          f"({concurrent / single:.2f}x a single request, {concurrency}x if serialized)")
+    print(f"worst event loop stall:      {lag * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated completion time in seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""End-to-end benchmark of the backend against a local OpenRouter stand-in.
+
+Starts benchmarks/fake_openrouter.py and the backend (one uvicorn worker) as subprocesses,
+each run with its own temporary repository store and caches, then runs these scenarios:
+
+    upload       upload synthetic repositories of each size, timed until the job completes
+    chat         distinct questions under concurrent load (response cache misses)
+    chat_repeat  one question repeated under concurrent load (cache hits and coalescing)
+    chat_stream  streamed answers: time to first token and to the end of the stream
+    docs         documentation requests under concurrent load
+
+For each scenario it reports p50/p99 latency, requests per second, errors and the
+backend's peak RSS (VmHWM, Linux only, reset between scenarios where the kernel allows).
+
+Usage (from the backend directory):
+    python benchmarks/bench_end_to_end.py [--sizes small medium] [--requests 50]
+        [--concurrency 8] [--completion-latency 0.2] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from synthetic_repo import SIZES, VERBS, WORDS, make_repo_zip  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+def peak_rss_mb(pid: int):
+    """Peak resident set size of a process in MiB, or None where /proc isn't available"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def reset_peak_rss(pid: int):
+    """Reset VmHWM so the next reading covers one scenario (Linux 4.0+)"""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def summarize(name: str, latencies: list, duration: float, errors: int, rss) -> dict:
+    values = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        "scenario": name,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 1),
+        "p99_ms": round(float(np.percentile(values, 99)) * 1000, 1),
+        "rps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "peak_rss_mb": round(rss, 1) if rss is not None else None
+    }
+
+
+async def run_load(count: int, concurrency: int, request):
+    """Run request(i) count times with at most concurrency in flight; returns (latencies, seconds, errors)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await request(i)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors += 1
+                print(f"  request {i} failed: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return latencies, time.perf_counter() - start, errors
+
+
+async def upload_and_wait(client: httpx.AsyncClient, data: bytes, name: str) -> str:
+    response = await client.post("/upload", files={"file": (f"{name}.zip", data, "application/zip")})
+    response.raise_for_status()
+    job = response.json()
+    while job["status"] not in ("completed", "failed"):
+        await asyncio.sleep(0.05)
+        job = (await client.get(f"/jobs/{job['job_id']}")).json()
+    if job["status"] == "failed":
+        raise RuntimeError(job["error"])
+    return job["repo_id"]
+
+
+def question(i: int) -> str:
+    return f"How does {VERBS[i % len(VERBS)]} {WORDS[i % len(WORDS)]} work in module{i % 20}? ({i})"
+
+
+async def run_scenarios(base_url: str, pid: int, args) -> list:
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+
+        async def measure(name: str, count: int, concurrency: int, request):
+            reset_peak_rss(pid)
+            latencies, duration, errors = await run_load(count, concurrency, request)
+            result = summarize(name, latencies, duration, errors, peak_rss_mb(pid))
+            results.append(result)
+            print(format_row(result))
+
+        repo_ids = {}
+        for size in args.sizes:
+            data = make_repo_zip(SIZES[size], seed=1)
+
+            async def upload(i, data=data, size=size):
+                repo_ids[size] = await upload_and_wait(client, data, f"{size}_{i}")
+
+            await measure(f"upload[{size}]", args.uploads, 1, upload)
+
+        repo_id = repo_ids[args.sizes[-1]]
+
+        async def chat(i):
+            response = await client.post("/chat", json={"repo_id": repo_id, "message": question(i)})
+            response.raise_for_status()
+
+        async def chat_repeat(i):
+            response = await client.post("/chat", json={"repo_id": repo_id, "message": "What does module0 do?"})
+            response.raise_for_status()
+
+        first_tokens = []
+
+        async def chat_stream(i):
+            start = time.perf_counter()
+            first_token = None
+            async with client.stream("POST", "/chat/stream", json={"repo_id": repo_id, "message": question(10_000 + i)}) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if first_token is None and line.startswith("data:"):
+                        first_token = time.perf_counter() - start
+            if first_token is not None:
+                first_tokens.append(first_token)
+
+        async def docs(i):
+            response = await client.post("/generate_docs", json={"repo_id": repo_id, "mode": "pipeline" if i % 2 else "single"})
+            response.raise_for_status()
+
+        await measure("chat", args.requests, args.concurrency, chat)
+        await measure("chat_repeat", args.requests, args.concurrency, chat_repeat)
+        await measure("chat_stream", args.requests, args.concurrency, chat_stream)
+        if first_tokens:
+            print(f"  chat_stream first token p50 {np.percentile(first_tokens, 50) * 1000:.1f} ms, "
+                  f"p99 {np.percentile(first_tokens, 99) * 1000:.1f} ms")
+        await measure("docs", max(args.requests // 5, 2), args.concurrency, docs)
+
+    return results
+
+
+def format_row(result: dict) -> str:
+    rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "n/a"
+    return (f"{result['scenario']:>16}  {result['requests']:>5}  {result['errors']:>4}  "
+            f"{result['p50_ms']:>9.1f}  {result['p99_ms']:>9.1f}  {result['rps']:>8.2f}  {rss:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--uploads", type=int, default=3, help="uploads per repository size")
+    parser.add_argument("--requests", type=int, default=50, help="requests per chat scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--completion-latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the backend's logs")
+    args = parser.parse_args()
+
+    fake_port, app_port = free_port(), free_port()
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="codemind-bench-") as workdir:
+        try:
+            fake = subprocess.Popen([
+                sys.executable, os.path.join(BENCHMARKS_DIR, "fake_openrouter.py"), "--port", str(fake_port),
+                "--embedding-latency", str(args.embedding_latency), "--completion-latency", str(args.completion_latency),
+                "--token-delay", str(args.token_delay), "--dim", str(args.dim)
+            ])
+            processes.append(fake)
+            wait_until_up(f"http://127.0.0.1:{fake_port}/docs", fake)
+
+            env = dict(
+                os.environ,
+                OPENROUTER_API_KEY="benchmark",
+                OPENROUTER_BASE_URL=f"http://127.0.0.1:{fake_port}/api/v1",
+                REPOSITORY_STORE_DIR=os.path.join(workdir, "repositories"),
+                EMBEDDING_CACHE_PATH=os.path.join(workdir, "embeddings.sqlite3"),
+                SUMMARY_CACHE_PATH=os.path.join(workdir, "summaries.sqlite3"),
+                UPLOAD_TEMP_DIR=os.path.join(workdir, "uploads")
+            )
+            app = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+                cwd=BACKEND_DIR, env=env,
+                stdout=None if args.verbose else subprocess.DEVNULL,
+                stderr=None if args.verbose else subprocess.DEVNULL
+            )
+            processes.append(app)
+            wait_until_up(f"http://127.0.0.1:{app_port}/health", app)
+
+            print(f"{'scenario':>16}  {'reqs':>5}  {'errs':>4}  {'p50 ms':>9}  {'p99 ms':>9}  {'req/s':>8}  {'peak MiB':>9}")
+            results = asyncio.run(run_scenarios(f"http://127.0.0.1:{app_port}", app.pid, args))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=10)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Cold-start benchmark: how soon a fresh backend process passes its health check.
+
+For each run it measures, in new processes:
+    import     importing app.main
+    health     launching uvicorn until GET /health answers 200
+    warm_up    launching uvicorn until the background warm-up has finished (from /metrics)
+    first_chat launching uvicorn until a first chat question about a stored repository is answered
+
+The store is first populated with --repositories synthetic repositories, uploaded
+through the backend itself. No API key is set, so nothing leaves the machine and chat
+uses the lexical fallback. Results are medians over --runs.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py [--runs 5] [--repositories 2] [--size small]
+        [--importtime] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from bench_end_to_end import free_port, upload_and_wait, wait_until_up  # noqa: E402
+from synthetic_repo import SIZES, make_repo_zip  # noqa: E402
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+WARM_UP_DONE = re.compile(r'codemind_stage_duration_seconds_count\{stage="warm_up"\} [1-9]')
+
+
+def backend_env(workdir: str) -> dict:
+    env = dict(
+        os.environ,
+        REPOSITORY_STORE_DIR=os.path.join(workdir, "repositories"),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, "embeddings.sqlite3"),
+        SUMMARY_CACHE_PATH=os.path.join(workdir, "summaries.sqlite3"),
+        UPLOAD_TEMP_DIR=os.path.join(workdir, "uploads")
+    )
+    env.pop("OPENROUTER_API_KEY", None)
+    return env
+
+
+def start_backend(env: dict, port: int, verbose: bool) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+        stdout=None if verbose else subprocess.DEVNULL,
+        stderr=None if verbose else subprocess.DEVNULL
+    )
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    process.wait(timeout=10)
+
+
+def populate(env: dict, repositories: int, size: str, verbose: bool) -> list:
+    """Upload synthetic repositories through a backend, returning their ids"""
+    port = free_port()
+    process = start_backend(env, port, verbose)
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}/health", process)
+
+        async def upload_all():
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+                return [
+                    await upload_and_wait(client, make_repo_zip(SIZES[size], seed=i, name=f"repo{i}"), f"repo{i}")
+                    for i in range(repositories)
+                ]
+
+        return asyncio.run(upload_all())
+    finally:
+        stop(process)
+
+
+def measure_import(env: dict) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_start(env: dict, repo_id, verbose: bool) -> dict:
+    """Seconds from launching the server to a healthy response, finished warm-up and a first chat answer"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = start_backend(env, port, verbose)
+    try:
+        with httpx.Client(base_url=url, timeout=60) as client:
+            health = None
+            while health is None:
+                if process.poll() is not None:
+                    raise RuntimeError(f"backend exited with code {process.returncode}")
+                try:
+                    if client.get("/health").status_code == 200:
+                        health = time.perf_counter() - start
+                except httpx.TransportError:
+                    time.sleep(0.01)
+
+            warm_up = None
+            while warm_up is None and time.perf_counter() - start < 60:
+                if WARM_UP_DONE.search(client.get("/metrics").text):
+                    warm_up = time.perf_counter() - start
+                else:
+                    time.sleep(0.01)
+
+            first_chat = None
+            if repo_id is not None:
+                response = client.post("/chat", json={"repo_id": repo_id, "message": "How are values validated?"})
+                response.raise_for_status()
+                first_chat = time.perf_counter() - start
+        return {"health": health, "warm_up": warm_up, "first_chat": first_chat}
+    finally:
+        stop(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--repositories", type=int, default=2, help="repositories in the store before the runs")
+    parser.add_argument("--size", choices=list(SIZES), default="small", help="size of each stored repository")
+    parser.add_argument("--importtime", action="store_true", help="also show the slowest imports of app.main")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the backend's logs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="codemind-startup-") as workdir:
+        env = backend_env(workdir)
+        repo_ids = populate(env, args.repositories, args.size, args.verbose) if args.repositories else []
+        repo_id = repo_ids[-1] if repo_ids else None
+
+        samples = {"import": [], "health": [], "warm_up": [], "first_chat": []}
+        for _ in range(args.runs):
+            samples["import"].append(measure_import(env))
+            for name, value in measure_start(env, repo_id, args.verbose).items():
+                if value is not None:
+                    samples[name].append(value)
+
+        if args.importtime:
+            trace = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import app.main"],
+                cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+            ).stderr
+            rows = []
+            for line in trace.splitlines():
+                parts = line.split("|")
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    rows.append((int(parts[1]), parts[2].strip()))
+            print("slowest imports (cumulative ms):")
+            for microseconds, module in sorted(rows, reverse=True)[:15]:
+                print(f"  {microseconds / 1000:8.1f}  {module}")
+
+    results = {
+        name: round(statistics.median(values) * 1000, 1)
+        for name, values in samples.items() if values
+    }
+    print(f"{'stage':>12}  {'median ms':>10}   (runs: {args.runs}, stored repositories: {args.repositories})")
+    for name, value in results.items():
+        print(f"{name:>12}  {value:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results_ms": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
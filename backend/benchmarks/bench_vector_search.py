@@ -0,0 +1,113 @@
+"""Benchmark top-k chunk search: the old per-chunk cosine loop vs VectorIndex, then the
+stored vector dtypes against each other.
+
+For each dtype (float32, float16, int8), with and without exact float32 rescoring of the
+top candidates, it reports the bytes a search scans, the time to reload a saved index
+(memory-mapped), the search time, and recall of the float32 top-k.
+
+Usage (from the backend directory):
+    python benchmarks/bench_vector_search.py [--sizes 1000 10000 100000] [--dim 1536]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vector_index import DTYPES, RESCORE_CANDIDATES, VectorIndex  # noqa: E402
+
+
+def loop_search(chunks, query_embedding, chunk_embeddings, top_k):
+    """The previous find_relevant_chunks implementation, minus the embedding calls"""
+    def cosine_sim(a, b):
+        if np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
+            return 0.0
+        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+    for chunk, emb in zip(chunks, chunk_embeddings):
+        chunk["relevance_score"] = cosine_sim(query_embedding, emb)
+
+    chunks.sort(key=lambda x: x["relevance_score"], reverse=True)
+    return chunks[:top_k]
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=1536, help="embedding size (text-embedding-3-small is 1536)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--rescore", type=int, default=RESCORE_CANDIDATES or 50, help="candidates rescored with float32 (compared with no rescoring)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>8} {'loop (ms)':>12} {'build (ms)':>12} {'search (ms)':>12} {'speedup':>9}")
+
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+        query = rng.standard_normal(args.dim, dtype=np.float32)
+        chunks = [{"file": f"file_{i}.py", "content": ""} for i in range(size)]
+
+        # The loop sorts the list it is given in place, so hand it a fresh copy each run
+        loop_s = best_of(lambda: loop_search(list(chunks), query, embeddings, args.top_k), args.repeats)
+
+        start = time.perf_counter()
+        index = VectorIndex(embeddings, dtype="float32")
+        build_s = time.perf_counter() - start
+        search_s = best_of(lambda: index.search(query, args.top_k), args.repeats)
+
+        # Both must agree on the ranking
+        expected = [c["file"] for c in loop_search(list(chunks), query, embeddings, args.top_k)]
+        actual = [f"file_{i}.py" for i, _ in index.search(query, args.top_k)]
+        assert expected == actual, f"ranking mismatch at {size} chunks"
+
+        print(f"{size:>8} {loop_s * 1000:>12.2f} {build_s * 1000:>12.2f} {search_s * 1000:>12.3f} "
+              f"{loop_s / search_s:>8.0f}x")
+
+        del index, chunks
+        compare_dtypes(embeddings, rng, args)
+        del embeddings
+
+
+def compare_dtypes(embeddings, rng, args, queries: int = 20):
+    """Size, reload time, search time and recall@top_k of each stored dtype against float32"""
+    # Queries near stored rows, like real questions about the code, so the top-k is meaningful
+    picks = rng.integers(0, len(embeddings), queries)
+    query_set = embeddings[picks] + 0.5 * rng.standard_normal((queries, args.dim), dtype=np.float32)
+    reference = VectorIndex(embeddings, dtype="float32")
+    expected = [set(i for i, _ in reference.search(q, args.top_k)) for q in query_set]
+
+    print(f"  {'dtype':>8} {'rescore':>8} {'MiB':>9} {'reload (ms)':>12} {'search (ms)':>12} {'recall':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for dtype in DTYPES:
+            for rescore in ([0] if dtype == "float32" else [0, args.rescore]):
+                path = os.path.join(directory, f"{dtype}.{rescore}.npy")
+                VectorIndex(embeddings, dtype=dtype, rescore=rescore).save(path)
+
+                start = time.perf_counter()
+                index = VectorIndex.load(path, rescore=rescore)
+                reload_s = time.perf_counter() - start
+
+                search_s = best_of(lambda: [index.search(q, args.top_k) for q in query_set], args.repeats) / queries
+                hits = sum(len(e & {i for i, _ in index.search(q, args.top_k)}) for e, q in zip(expected, query_set))
+                recall = hits / (queries * args.top_k)
+                print(f"  {dtype:>8} {rescore:>8} {index.nbytes / 2**20:>9.1f} {reload_s * 1000:>12.3f} "
+                      f"{search_s * 1000:>12.3f} {recall:>8.3f}")
+                del index
+
+
+if __name__ == "__main__":
+    main()
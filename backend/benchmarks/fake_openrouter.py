@@ -0,0 +1,153 @@
+"""Local stand-in for the OpenRouter API, for benchmarks that must not call the real one.
+
+Serves the two OpenAI-compatible endpoints the backend uses, with configurable latency:
+    POST /api/v1/embeddings        deterministic vectors seeded by each input's sha256
+    POST /api/v1/chat/completions  a fixed answer, as JSON or streamed as server-sent events
+
+Point the backend at it with OPENROUTER_BASE_URL=http://127.0.0.1:<port>/api/v1.
+
+With --rate-limit N it allows N requests per --rate-window seconds, like OpenRouter:
+every response carries X-RateLimit-Limit/Remaining/Reset headers, and requests over
+the limit get a 429 with Retry-After.
+
+Usage (from the backend directory):
+    python benchmarks/fake_openrouter.py [--port 8765] [--embedding-latency 0.05]
+        [--completion-latency 0.5] [--token-delay 0.01] [--dim 1536]
+        [--rate-limit 0] [--rate-window 60]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_LATENCY = float(os.getenv("FAKE_EMBEDDING_LATENCY", 0.05))
+COMPLETION_LATENCY = float(os.getenv("FAKE_COMPLETION_LATENCY", 0.5))
+TOKEN_DELAY = float(os.getenv("FAKE_TOKEN_DELAY", 0.01))
+EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", 1536))
+RATE_LIMIT = int(os.getenv("FAKE_RATE_LIMIT", 0))
+RATE_WINDOW = float(os.getenv("FAKE_RATE_WINDOW", 60))
+
+# Fixed rate-limit window: [start time, requests so far]
+_window = [0.0, 0]
+
+ANSWER_TOKENS = ["This ", "repository ", "defines ", "a ", "small ", "service; ", "see ", "the ", "files ", "listed ", "below."] * 8
+
+app = FastAPI()
+
+
+def embed(text: str) -> list:
+    """Deterministic unit vector for a text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def usage(prompt: str) -> dict:
+    prompt_tokens = len(prompt) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(ANSWER_TOKENS),
+        "total_tokens": prompt_tokens + len(ANSWER_TOKENS)
+    }
+
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    if RATE_LIMIT <= 0:
+        return await call_next(request)
+
+    now = time.time()
+    if now - _window[0] >= RATE_WINDOW:
+        _window[0], _window[1] = now, 0
+    _window[1] += 1
+    reset = _window[0] + RATE_WINDOW
+    headers = {
+        "X-RateLimit-Limit": str(RATE_LIMIT),
+        "X-RateLimit-Remaining": str(max(RATE_LIMIT - _window[1], 0)),
+        "X-RateLimit-Reset": str(int(reset * 1000))
+    }
+    if _window[1] > RATE_LIMIT:
+        headers["Retry-After"] = f"{reset - now:.2f}"
+        return JSONResponse({"error": {"message": "Rate limit exceeded", "code": 429}}, status_code=429, headers=headers)
+
+    response = await call_next(request)
+    response.headers.update(headers)
+    return response
+
+
+@app.post("/api/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(EMBEDDING_LATENCY)
+    data = [{"object": "embedding", "index": i, "embedding": embed(text)} for i, text in enumerate(inputs)]
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model"),
+        "usage": {"prompt_tokens": sum(len(t) // 4 + 1 for t in inputs), "total_tokens": 0}
+    }
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = "".join(message["content"] for message in body["messages"])
+
+    if not body.get("stream"):
+        await asyncio.sleep(COMPLETION_LATENCY)
+        return JSONResponse({
+            "id": "fake",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(ANSWER_TOKENS)}, "finish_reason": "stop"}],
+            "usage": usage(prompt)
+        })
+
+    async def events():
+        # Time to first token, then a steady token rate
+        await asyncio.sleep(max(COMPLETION_LATENCY - TOKEN_DELAY * len(ANSWER_TOKENS), 0))
+        yield b": OPENROUTER PROCESSING\n\n"
+        for token in ANSWER_TOKENS:
+            await asyncio.sleep(TOKEN_DELAY)
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage(prompt)}
+        yield f"data: {json.dumps(final)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main():
+    global EMBEDDING_LATENCY, COMPLETION_LATENCY, TOKEN_DELAY, EMBEDDING_DIM, RATE_LIMIT, RATE_WINDOW
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embedding-latency", type=float, default=EMBEDDING_LATENCY, help="seconds per embeddings request")
+    parser.add_argument("--completion-latency", type=float, default=COMPLETION_LATENCY, help="seconds per completion")
+    parser.add_argument("--token-delay", type=float, default=TOKEN_DELAY, help="seconds between streamed tokens")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="embedding dimensions")
+    parser.add_argument("--rate-limit", type=int, default=RATE_LIMIT, help="requests allowed per window, 0 for no limit")
+    parser.add_argument("--rate-window", type=float, default=RATE_WINDOW, help="seconds per rate-limit window")
+    args = parser.parse_args()
+
+    EMBEDDING_LATENCY = args.embedding_latency
+    COMPLETION_LATENCY = args.completion_latency
+    TOKEN_DELAY = args.token_delay
+    EMBEDDING_DIM = args.dim
+    RATE_LIMIT = args.rate_limit
+    RATE_WINDOW = args.rate_window
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Generate synthetic Python repository ZIPs of a given size for benchmarks.
+
+Each file holds a documented class with methods and a few module-level functions that
+import and call each other, so chunking, the symbol index and retrieval all have
+realistic work to do. Output is deterministic for a given seed.
+
+Usage (from the backend directory):
+    python benchmarks/synthetic_repo.py out.zip [--files 200] [--functions 8] [--seed 0]
+"""
+import argparse
+import io
+import random
+import zipfile
+
+WORDS = [
+    "account", "buffer", "cache", "client", "config", "connection", "event", "file", "handler",
+    "index", "job", "message", "order", "parser", "payment", "queue", "record", "report", "request",
+    "session", "socket", "stream", "task", "token", "user", "worker"
+]
+VERBS = ["build", "check", "close", "fetch", "load", "merge", "parse", "process", "read", "render", "save", "send", "update", "validate"]
+
+SIZES = {
+    "small": 20,
+    "medium": 200,
+    "large": 1000
+}
+
+
+def _module_source(rng: random.Random, package: str, index: int, modules: list, functions: int) -> str:
+    noun = rng.choice(WORDS)
+    class_name = f"{noun.capitalize()}{rng.choice(WORDS).capitalize()}{index}"
+    lines = [f'"""{noun.capitalize()} utilities for the {package} package (module {index})."""', "import json", "import logging"]
+
+    imports = rng.sample(modules, k=min(2, len(modules)))
+    for other in imports:
+        lines.append(f"from {package} import {other}")
+    lines += ["", "logger = logging.getLogger(__name__)", ""]
+
+    lines += [
+        f"class {class_name}:",
+        f'    """Keeps track of {noun} state and applies updates to it."""',
+        "",
+        "    def __init__(self, name, limit=100):",
+        "        self.name = name",
+        "        self.limit = limit",
+        "        self.items = []",
+        ""
+    ]
+    for _ in range(max(functions // 2, 1)):
+        verb = rng.choice(VERBS)
+        method = f"{verb}_{rng.choice(WORDS)}"
+        lines += [
+            f"    def {method}(self, value):",
+            f'        """{verb.capitalize()} a value and record it."""',
+            "        if len(self.items) >= self.limit:",
+            f'            logger.warning("{class_name} is full")',
+            "            return None",
+            "        result = {'name': self.name, 'value': value}",
+            "        self.items.append(result)",
+            "        return json.dumps(result)",
+            ""
+        ]
+
+    for number in range(functions):
+        verb = rng.choice(VERBS)
+        name = f"{verb}_{rng.choice(WORDS)}_{number}"
+        call = f"{imports[0]}.helper_{rng.randrange(functions)}(data)" if imports else "data"
+        lines += [
+            "",
+            f"def {name}(data, retries=3):",
+            f'    """{verb.capitalize()} the {rng.choice(WORDS)} data, retrying on failure."""',
+            "    for attempt in range(retries):",
+            "        try:",
+            f"            return {call}",
+            "        except ValueError as exc:",
+            f'            logger.error("{name} failed: %s", exc)',
+            "    return None",
+        ]
+
+    for number in range(functions):
+        lines += ["", f"def helper_{number}(data):", "    return data"]
+    return "\n".join(lines) + "\n"
+
+
+def make_repo_zip(files: int = 200, functions: int = 8, seed: int = 0, name: str = "synthetic") -> bytes:
+    """Build a repository ZIP in memory with files spread over packages of 25 modules"""
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for start in range(0, files, 25):
+            package = f"pkg{start // 25}"
+            modules = [f"module{i}" for i in range(start, min(start + 25, files))]
+            archive.writestr(f"{name}/{package}/__init__.py", "")
+            for i, module in enumerate(modules):
+                source = _module_source(rng, package, start + i, [m for m in modules if m != module], functions)
+                archive.writestr(f"{name}/{package}/{module}.py", source)
+        archive.writestr(f"{name}/main.py", '"""Entry point."""\nfrom pkg0 import module0\n\nif __name__ == "__main__":\n    print(module0.helper_0("ok"))\n')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output")
+    parser.add_argument("--files", type=int, default=SIZES["medium"])
+    parser.add_argument("--functions", type=int, default=8, help="functions per module")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = make_repo_zip(args.files, args.functions, args.seed)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {args.output}: {args.files} modules, {len(data) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
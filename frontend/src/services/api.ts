@@ -1,7 +1,8 @@
 import axios from 'axios';
-import type { Repository, ChatResponse } from '../types';
+import type { Repository, ChatResponse, UploadJob } from '../types';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:10000';
+const UPLOAD_POLL_INTERVAL_MS = 1000;
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -26,13 +27,23 @@ export class ApiService {
     const formData = new FormData();
     formData.append('file', file);
 
-    const response = await api.post('/upload', formData, {
+    const response = await api.post<UploadJob>('/upload', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
       },
     });
 
-    return response.data;
+    // The upload is processed in the background, poll until the repository is ready
+    let job = response.data;
+    while (job.status !== 'completed') {
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Repository processing failed');
+      }
+      await new Promise((resolve) => setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS));
+      job = (await api.get<UploadJob>(`/jobs/${job.job_id}`)).data;
+    }
+
+    return job.repository as Repository;
   }
 
   static async chat(repoId: string, message: string): Promise<ChatResponse> {
@@ -5,6 +5,18 @@ export interface Repository {
   fileCount: number;
 }
 
+export interface UploadJob {
+  job_id: string;
+  repo_id: string;
+  name: string;
+  status: 'pending' | 'extracting' | 'indexing' | 'completed' | 'failed';
+  files_scanned: number;
+  chunks_total: number;
+  chunks_embedded: number;
+  error: string | null;
+  repository: Repository | null;
+}
+
 export interface ChatMessage {
   id: string;
   type: 'user' | 'assistant';